@@ -1,9 +1,7 @@
 import os
 from typing import Optional
 import numpy as np
-from openai import OpenAI
 from dotenv import load_dotenv
-import tiktoken
 from datetime import datetime
 from flask import g
 from app.utils.response_processor import (
@@ -21,7 +19,12 @@ DEFAULT_CONFIG = {
     "prompt": "Please provide helpful and accurate responses."
 }
 from app.config.knowledge_config import get_active_knowledge_bases, get_knowledge_bases_for_agent
-from app.utils.knowledge_processor import search_knowledge_base, EMBEDDING_MODEL
+from app.utils.knowledge_processor import (
+    search_knowledge_base,
+    EMBEDDING_MODEL,
+    get_cached_openai_client,
+    get_token_encoding,
+)
 from app.config.model_config import get_current_model, get_current_temperature, get_model_parameters, should_use_responses_api
 from app.utils.secure_access import secure_knowledge_base_access
 
@@ -96,7 +99,7 @@ def truncate_history_by_tokens(history: list, max_tokens: int, encoding_name: st
         return []
     
     try:
-        encoding = tiktoken.get_encoding(encoding_name)
+        encoding = get_token_encoding(encoding_name)
     except Exception as e:
         print(f"[WARN] Could not load tiktoken encoding '{encoding_name}': {e}")
         print("Falling back to message count limit (last 5 messages)")
@@ -156,7 +159,7 @@ def truncate_history_by_tokens(history: list, max_tokens: int, encoding_name: st
 
 # Initialize OpenAI client with API key from config
 def _get_openai_client(provider_key_name: Optional[str] = None):
-    """Get OpenAI client with proper API key"""
+    """Get OpenAI client with proper API key (shared with KB embedding)"""
     try:
         from app.config.provider_config import get_provider_api_key
         selected_key_name = provider_key_name
@@ -165,7 +168,7 @@ def _get_openai_client(provider_key_name: Optional[str] = None):
         api_key = get_provider_api_key("openai", selected_key_name)
         if not api_key:
             raise ValueError("No API key configured")
-        return OpenAI(api_key=api_key)
+        return get_cached_openai_client(api_key)
     except ImportError:
         raise ValueError("API config not available")
 
@@ -382,7 +385,7 @@ def search_agent_knowledge_bases(query, agent, top_k=3):
     kb_lookup = {kb["id"]: kb.get("title", "Unknown Source") for kb in knowledge_bases}
     
     # Step 1: Group KBs by embedding provider for efficient search
-    from app.utils.knowledge_processor import create_embedding, search_knowledge_base_with_embedding
+    from app.utils.knowledge_processor import create_embedding, search_knowledge_bases_with_embedding
     
     provider_groups = {}
     for kb in knowledge_bases:
@@ -405,11 +408,10 @@ def search_agent_knowledge_bases(query, agent, top_k=3):
                 key_name=provider_key_name,
             )
             
-            # Search all KBs in this provider group
-            for kb in kbs:
-                kb_results = search_knowledge_base_with_embedding(kb["id"], query_embedding, top_k)
-                if kb_results:
-                    all_results.extend(kb_results)
+            # Search all KBs in this provider group together
+            all_results.extend(
+                search_knowledge_bases_with_embedding([kb["id"] for kb in kbs], query_embedding, top_k)
+            )
         except Exception as e:
             print(f"[ERROR] Searching {provider} knowledge bases: {e}")
     
@@ -1027,7 +1029,7 @@ def _generate_with_gemini(message_body, history=None, agent=None, skip_post_proc
     """
     Generate reply using Google Gemini API.
     """
-    from app.utils.gemini_client import GeminiClient
+    from app.utils.gemini_client import get_gemini_client
     
     # SECURITY: Already checked in generate_reply
     if not agent:
@@ -1088,7 +1090,7 @@ def _generate_with_gemini(message_body, history=None, agent=None, skip_post_proc
     
     try:
         key_name = getattr(agent, "provider_key_name", "default")
-        client = GeminiClient(key_name=key_name)
+        client = get_gemini_client(key_name=key_name)
         
         # Prepare messages for Gemini
         messages = [
@@ -18,8 +18,12 @@ DEFAULT_KNOWLEDGE_BASES = {
 
 MAX_IMPORT_ZIP_BYTES = 100 * 1024 * 1024
 MAX_IMPORT_MEMBER_BYTES = 500 * 1024 * 1024
+CHUNKS_MSGPACK_ZST = "chunks.msgpack.zst"
 CHUNKS_JSON_GZ = "chunks.json.gz"
 LEGACY_CHUNKS_GZ = "chunks.pkl.gz"
+INDEX_META_JSON = "index_meta.json"
+CHUNKS_BIN = "chunks.bin"
+CHUNKS_IDX = "chunks.idx"
 
 
 def _safe_member_path(root_dir: str, member_name: str) -> Optional[str]:
@@ -525,7 +529,7 @@ def export_knowledge_base(kb_id: str, include_embeddings: bool = True) -> tuple[
     if os.path.exists(embeddings_path):
         import numpy as np
         try:
-            embeddings = np.load(embeddings_path)
+            embeddings = np.load(embeddings_path, mmap_mode="r", allow_pickle=False)
             dimensions = embeddings.shape[1] if len(embeddings.shape) > 1 else len(embeddings)
             chunk_count = embeddings.shape[0] if len(embeddings.shape) > 0 else 1
         except:
@@ -570,7 +574,7 @@ def export_knowledge_base(kb_id: str, include_embeddings: bool = True) -> tuple[
             
             # Add processed files if requested and available
             if include_embeddings and os.path.exists(processed_folder):
-                for filename in [CHUNKS_JSON_GZ, LEGACY_CHUNKS_GZ, 'embeddings.npy', 'index.faiss']:
+                for filename in [CHUNKS_MSGPACK_ZST, CHUNKS_JSON_GZ, LEGACY_CHUNKS_GZ, CHUNKS_BIN, CHUNKS_IDX, 'embeddings.npy', 'index.faiss', INDEX_META_JSON]:
                     file_path = os.path.join(processed_folder, filename)
                     if os.path.exists(file_path):
                         archive_name = f'processed/{filename}'
@@ -700,10 +704,17 @@ def import_knowledge_base(zip_file, user_embedding_provider: str, user_embedding
             os.makedirs(new_processed_folder, exist_ok=True)
             processed_temp_path = os.path.join(temp_dir, 'processed')
 
-            safe_reuse_files = [CHUNKS_JSON_GZ, 'embeddings.npy', 'index.faiss']
-            if not os.path.exists(os.path.join(processed_temp_path, CHUNKS_JSON_GZ)):
+            safe_reuse_files = [CHUNKS_MSGPACK_ZST, CHUNKS_JSON_GZ, CHUNKS_BIN, CHUNKS_IDX, 'embeddings.npy', 'index.faiss', INDEX_META_JSON]
+            has_chunk_records = all(
+                os.path.exists(os.path.join(processed_temp_path, filename))
+                for filename in (CHUNKS_BIN, CHUNKS_IDX)
+            )
+            if not has_chunk_records and not any(
+                os.path.exists(os.path.join(processed_temp_path, filename))
+                for filename in (CHUNKS_MSGPACK_ZST, CHUNKS_JSON_GZ)
+            ):
                 can_reuse_embeddings = False
-                warnings.append("Package does not contain JSON chunks; reprocessing required")
+                warnings.append("Package does not contain chunk records or JSON/msgpack chunks; reprocessing required")
             else:
                 for filename in safe_reuse_files:
                     src = os.path.join(processed_temp_path, filename)
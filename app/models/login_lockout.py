@@ -0,0 +1,137 @@
+import os
+import time
+from typing import Optional
+
+try:
+    import redis  # type: ignore
+except ImportError:
+    redis = None
+
+MAX_FAILED_ATTEMPTS = 5
+LOCKOUT_SECONDS = 15 * 60
+# Login requests wait at most this long on Redis before using the database
+REDIS_SOCKET_TIMEOUT = 0.5
+# After a connection failure, skip Redis for this long instead of timing out on every request
+REDIS_RETRY_SECONDS = 30
+
+
+class LoginLockoutManager:
+    """
+    Tracks failed login attempts outside the user table.
+
+    Counters live in Redis (INCR + EXPIRE) when LOCKOUT_REDIS_URL is set and the
+    redis package is installed, so every web worker shares them and a bad
+    password costs no SQL write. Without Redis, or while it is unreachable, the
+    methods return None and callers fall back to the failed_login_count /
+    locked_until columns on the user row, which all workers share. Connections
+    use short socket timeouts, and Redis is skipped for REDIS_RETRY_SECONDS
+    after a failure, so a down or unreachable host cannot stall logins.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        max_attempts: int = MAX_FAILED_ATTEMPTS,
+        lockout_seconds: int = LOCKOUT_SECONDS,
+    ):
+        self.max_attempts = max_attempts
+        self.lockout_seconds = lockout_seconds
+        self._redis = None
+        self._retry_at = 0.0
+        if redis_url and redis is not None:
+            self._redis = redis.Redis.from_url(
+                redis_url,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+            )
+        elif redis_url:
+            print("[WARN] redis not installed; tracking login lockouts in the database")
+
+    def _client(self):
+        """The Redis client, or None when not configured or recently unreachable."""
+        if self._redis is None or time.monotonic() < self._retry_at:
+            return None
+        return self._redis
+
+    def _unavailable(self, e):
+        # Timeouts and refused connections both land here (RedisError subclasses)
+        print(f"[WARN] Login lockout store unavailable, using database: {e}")
+        self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    @staticmethod
+    def _fail_key(user_id) -> str:
+        return f"login_fail:{user_id}"
+
+    @staticmethod
+    def _lock_key(user_id) -> str:
+        return f"locked:{user_id}"
+
+    def register_failure(self, user_id) -> Optional[bool]:
+        """
+        Count a failed attempt. Returns True if this attempt locked the account,
+        or None when Redis is not available and the caller must count it.
+        """
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            pipe = client.pipeline()
+            pipe.incr(self._fail_key(user_id))
+            pipe.expire(self._fail_key(user_id), self.lockout_seconds)
+            count, _ = pipe.execute()
+            if count >= self.max_attempts:
+                client.set(self._lock_key(user_id), 1, ex=self.lockout_seconds)
+                client.delete(self._fail_key(user_id))
+                return True
+            return False
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return None
+
+    def record_failure(self, user) -> bool:
+        """
+        Count a failed attempt for a user row and return True if it locked the
+        account. Uses Redis when available, otherwise the user's own counter;
+        the caller commits the session.
+        """
+        locked = self.register_failure(user.id)
+        if locked is None:
+            # No shared lockout store: count on the user row so all workers agree
+            user.increment_failed_login()
+            return user.is_locked()
+        if locked:
+            user.record_lockout(self.max_attempts, self.lockout_seconds)
+        return locked
+
+    def seconds_remaining(self, user_id) -> Optional[int]:
+        """Seconds left on an active lock (0 when unlocked), or None when Redis is not available."""
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            ttl = client.ttl(self._lock_key(user_id))
+        except redis.RedisError as e:
+            self._unavailable(e)
+            return None
+        return max(int(ttl or 0), 0)
+
+    def is_locked(self, user_id) -> bool:
+        return (self.seconds_remaining(user_id) or 0) > 0
+
+    def reset(self, user_id):
+        """Clear failure counter and lock on successful authentication."""
+        client = self._client()
+        if client is None:
+            return
+        try:
+            client.delete(self._fail_key(user_id), self._lock_key(user_id))
+        except redis.RedisError as e:
+            print(f"[WARN] Could not clear login lockout for user {user_id}: {e}")
+
+
+def _redis_url() -> Optional[str]:
+    return os.environ.get("LOCKOUT_REDIS_URL", "").strip() or None
+
+
+# Global instance
+login_lockout_manager = LoginLockoutManager(redis_url=_redis_url())
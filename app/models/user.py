@@ -57,13 +57,29 @@ class User(db.Model, UserMixin):
             return False
         return datetime.utcnow() < self.locked_until
     
+    def lock_seconds_remaining(self):
+        """Seconds left on the persisted lock, or 0 when not locked"""
+        if not self.is_locked():
+            return 0
+        return int((self.locked_until - datetime.utcnow()).total_seconds())
+    
     def increment_failed_login(self):
         """Increment failed login counter and lock if threshold reached"""
-        self.failed_login_count += 1
+        if self.locked_until is not None and not self.is_locked():
+            # Previous lock expired: start a fresh window
+            self.failed_login_count = 0
+            self.locked_until = None
+        self.failed_login_count = (self.failed_login_count or 0) + 1
         if self.failed_login_count >= 5:
             from datetime import timedelta
             self.locked_until = datetime.utcnow() + timedelta(minutes=15)
     
+    def record_lockout(self, attempts, lockout_seconds):
+        """Persist a lockout triggered by the login lockout store (audit/history)"""
+        from datetime import timedelta
+        self.failed_login_count = attempts
+        self.locked_until = datetime.utcnow() + timedelta(seconds=lockout_seconds)
+    
     def reset_failed_login(self):
         """Reset failed login counter on successful login"""
         self.failed_login_count = 0
@@ -0,0 +1,154 @@
+"""
+Content-addressed on-disk cache for chunk embeddings.
+
+Vectors are keyed by a hash of the provider, embedding model and chunk text, so
+re-processing a knowledge base (or embedding boilerplate that repeats across
+documents) only pays the API for text that has not been seen before. The
+vectors are capped at EMBEDDING_CACHE_MAX_BYTES; the least recently used ones
+are pruned once the cache grows past that.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "knowledge_bases", "embedding_cache.db"
+)
+# Bump to invalidate every cached vector (e.g. after changing how text is embedded)
+EMBEDDING_CACHE_VERSION = 2
+# ~87k vectors of the default 3072-dim model, ~175k at 1536 dims
+EMBEDDING_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Prune down to this fraction of the cap so pruning doesn't run on every write
+EMBEDDING_CACHE_PRUNE_TO = 0.9
+# Hits only refresh last_used once it is this old, so reads rarely write
+EMBEDDING_CACHE_TOUCH_INTERVAL = 24 * 60 * 60
+# Stay under SQLite's default bound-parameter limit
+_SELECT_BATCH = 500
+
+
+def embedding_cache_key(provider: str, model: str, text: str) -> str:
+    """Hash of cache version + provider + model + chunk text used as the cache key."""
+    raw = f"{EMBEDDING_CACHE_VERSION}\0{provider}\0{model}\0{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed store of float32 vectors, stored as raw bytes with their dimension."""
+
+    def __init__(self, path: str = None, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path or EMBEDDING_CACHE_PATH
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._byte_count = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets concurrent KB builds read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vec BLOB NOT NULL, "
+                "last_used REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_used" not in columns:
+                # Caches created before pruning existed; their rows count as least recent
+                conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._byte_count = self._stored_bytes(conn)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _stored_bytes(conn: sqlite3.Connection) -> int:
+        # float32 vectors: 4 bytes per dimension
+        return 4 * (conn.execute("SELECT COALESCE(SUM(dim), 0) FROM embeddings").fetchone()[0])
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the given keys (missing keys are omitted)."""
+        found: Dict[str, np.ndarray] = {}
+        stale_keys: List[str] = []
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(unique_keys), _SELECT_BATCH):
+                batch = unique_keys[start : start + _SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, dim, vec, last_used FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, dim, blob, last_used in rows:
+                    vector = np.frombuffer(blob, dtype="float32")
+                    if vector.shape[0] == dim:
+                        found[key] = vector
+                        if last_used < now - EMBEDDING_CACHE_TOUCH_INTERVAL:
+                            stale_keys.append(key)
+            for start in range(0, len(stale_keys), _SELECT_BATCH):
+                batch = stale_keys[start : start + _SELECT_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                    [now, *batch],
+                )
+            if stale_keys:
+                conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Store vectors keyed by cache key, pruning least recently used rows past the cap."""
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, int(vector.shape[0]), np.asarray(vector, dtype="float32").tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vec, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+            # Replaced keys are over-counted here; _prune recounts before deleting
+            self._byte_count += sum(len(row[2]) for row in rows)
+            if self._byte_count > self.max_bytes:
+                self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Delete least recently used rows down to EMBEDDING_CACHE_PRUNE_TO of the cap."""
+        self._byte_count = self._stored_bytes(conn)
+        if self._byte_count <= self.max_bytes:
+            return
+        excess = self._byte_count - int(self.max_bytes * EMBEDDING_CACHE_PRUNE_TO)
+        doomed: List[str] = []
+        cursor = conn.execute("SELECT key, dim FROM embeddings ORDER BY last_used")
+        for key, dim in cursor:
+            if excess <= 0:
+                break
+            doomed.append(key)
+            excess -= 4 * dim
+            self._byte_count -= 4 * dim
+        cursor.close()
+        for start in range(0, len(doomed), _SELECT_BATCH):
+            batch = doomed[start : start + _SELECT_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM embeddings WHERE key IN ({placeholders})", batch)
+        conn.commit()
+
+
+# Global instance
+embedding_cache = EmbeddingCache()
@@ -3,6 +3,7 @@ Gemini API client wrapper using official google-genai SDK.
 Provides unified interface matching OpenAI pattern for easier integration.
 """
 
+import functools
 from typing import List, Dict, Optional
 try:
     from google import genai
@@ -42,21 +43,19 @@ class GeminiClient:
         Returns:
             GeminiResponse object with .text and .content attributes
         """
-        # Extract system instruction and build content
-        system_instruction = None
-        user_content = []
+        # Extract system instruction (last one wins)
+        system_instruction = next(
+            (msg["content"] for msg in reversed(messages) if msg["role"] == "system"),
+            None,
+        )
         
-        for msg in messages:
-            if msg["role"] == "system":
-                system_instruction = msg["content"]
-            elif msg["role"] == "user":
-                user_content.append(msg["content"])
-            elif msg["role"] == "assistant":
-                # For multi-turn conversations
-                user_content.append(f"[Previous Response]\n{msg['content']}\n")
-        
-        # Combine user content
-        contents = "\n".join(user_content)
+        # Combine user content in one join; assistant turns are kept for multi-turn context
+        contents = "\n".join(
+            msg["content"] if msg["role"] == "user"
+            else "[Previous Response]\n" + msg["content"] + "\n"
+            for msg in messages
+            if msg["role"] in ("user", "assistant")
+        )
         
         try:
             # Call the new API (config parameters not yet supported in this SDK version)
@@ -89,21 +88,61 @@ class GeminiClient:
                 contents=content
             )
             
-            # Extract embedding from response
-            # The new SDK returns embeddings in a different format
-            if hasattr(result, 'embeddings') and len(result.embeddings) > 0:
-                embedding = result.embeddings[0].values
-            elif hasattr(result, 'embedding'):
-                embedding = result.embedding
-            else:
-                # Fallback: try to access as dict
-                embedding = result.get('embedding', [])
+            # google-genai returns EmbedContentResponse.embeddings: List[ContentEmbedding]
+            if not result.embeddings:
+                raise ValueError("Gemini returned no embeddings")
             
-            return GeminiEmbeddingResponse(embedding)
+            return GeminiEmbeddingResponse(result.embeddings[0].values)
         except Exception as e:
             print(f"[ERROR] Gemini embedding error: {e}")
             raise
 
+    def embed_contents(self, model: str, contents: List[str]) -> List["GeminiEmbeddingResponse"]:
+        """
+        Generate embeddings for several texts in a single API call.
+        
+        Args:
+            model: Embedding model name (e.g., "gemini-embedding-001")
+            contents: Texts to embed (the API accepts up to 100 per request)
+            
+        Returns:
+            List of GeminiEmbeddingResponse, in the same order as contents
+        """
+        try:
+            result = self.client.models.embed_content(
+                model=model,
+                contents=list(contents)
+            )
+            embeddings = result.embeddings or []
+            if len(embeddings) != len(contents):
+                raise ValueError(
+                    f"Expected {len(contents)} embeddings, got {len(embeddings)}"
+                )
+            return [GeminiEmbeddingResponse(item.values) for item in embeddings]
+        except Exception as e:
+            print(f"[ERROR] Gemini batch embedding error: {e}")
+            raise
+
+@functools.lru_cache(maxsize=4)
+def _get_cached_gemini_client(api_key: str) -> GeminiClient:
+    return GeminiClient(api_key=api_key)
+
+
+def get_gemini_client(key_name: Optional[str] = None) -> GeminiClient:
+    """
+    Get a shared GeminiClient for the selected key.
+    
+    The key is resolved on every call so rotated keys take effect, but the
+    underlying genai.Client (and its connection pool) is reused per key.
+    """
+    selected_key_name = key_name
+    if selected_key_name in (None, "", "default"):
+        selected_key_name = None
+    api_key = get_provider_api_key("gemini", selected_key_name)
+    if not api_key:
+        raise ValueError("No Gemini API key configured")
+    return _get_cached_gemini_client(api_key)
+
 class GeminiResponse:
     """Response wrapper to match OpenAI response structure"""
     def __init__(self, text: str):
@@ -0,0 +1,41 @@
+"""
+JSON file helpers for the config migration scripts.
+
+orjson is used when installed and the stdlib json module otherwise; both
+produce the same two-space indented, non-ASCII-preserving output.
+"""
+
+import json
+import os
+from typing import Any
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+
+def read_json(path: str) -> Any:
+    """Parse a UTF-8 JSON file. Raises json.JSONDecodeError on malformed input."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def write_json(path: str, data: Any):
+    """
+    Write data as indented UTF-8 JSON.
+
+    The payload goes to a temporary file that replaces the target in one
+    step, so a crash mid-write never leaves a truncated config behind.
+    """
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
@@ -1,11 +1,24 @@
 import os
+import re
+import atexit
 import gzip
 import json
+import functools
 import time
 import ipaddress
 import socket
 import logging
-from typing import Iterable, Iterator, List, Optional
+import mmap
+import multiprocessing
+import queue
+import random
+import struct
+import sys
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
 import faiss
@@ -15,23 +28,172 @@ from bs4 import BeautifulSoup
 from docx import Document
 import pickle
 import requests
-from openai import OpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from openai import APIConnectionError, APITimeoutError, DefaultHttpxClient, OpenAI
+import httpx
 from dotenv import load_dotenv
 
+from app.utils import pdf_worker
+
 try:
     import tiktoken  # type: ignore
 except ImportError:
     tiktoken = None
 
+try:
+    # selectolax >= 1.0 only ships the lexbor backend
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser  # type: ignore
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml  # type: ignore  # noqa: F401 - faster BeautifulSoup tree builder
+    BS4_PARSER = "lxml"
+except ImportError:
+    BS4_PARSER = "html.parser"
+
+try:
+    import h2  # type: ignore  # noqa: F401 - lets httpx negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    import msgpack  # type: ignore
+    import zstandard  # type: ignore
+except ImportError:
+    msgpack = None
+    zstandard = None
+
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None
+
+try:
+    import fcntl  # type: ignore
+except ImportError:  # Windows: the in-process lock still prevents double migration
+    fcntl = None
+
 EMBEDDING_MODEL = "text-embedding-3-large"
 DEFAULT_EMBEDDING_DIM = 3072
+CHUNKS_MSGPACK_ZST = "chunks.msgpack.zst"
 CHUNKS_JSON_GZ = "chunks.json.gz"
 LEGACY_CHUNKS_GZ = "chunks.pkl.gz"
 LEGACY_CHUNKS_RAW = "chunks.pkl"
+INDEX_META_JSON = "index_meta.json"
+CHUNKS_BIN = "chunks.bin"
+CHUNKS_IDX = "chunks.idx"
+CHUNKS_GZIP_LEVEL = 1
+# Each spawned worker starts a fresh interpreter, so only large PDFs go parallel
+PDF_PARALLEL_MIN_PAGES = 64
+PREFETCH_SEGMENTS = 8
+# Capped so a KB build does not claim every core of a shared web host
+PDF_MAX_WORKERS = min(4, os.cpu_count() or 1)
 MAX_REDIRECTS = 5
+# Largest URL body read into memory; larger pages are rejected
+URL_MAX_BYTES = 10 * 1024 * 1024
+URL_READ_CHUNK = 64 * 1024
+DNS_CACHE_TTL = 30
+DNS_CACHE_SIZE = 256
+GEMINI_MAX_EMBED_BATCH = 100
+OPENAI_MAX_EMBED_BATCH = 2048
+EMBEDDING_MAX_WORKERS = 4
+# Retries for rate-limited / transient embedding failures (exponential backoff)
+EMBEDDING_MAX_ATTEMPTS = 5
+EMBEDDING_BACKOFF_BASE = 1.0
+EMBEDDING_BACKOFF_MAX = 30.0
+# A chat request waits on its query embeddings: fail fast instead of backing off
+QUERY_EMBEDDING_MAX_ATTEMPTS = 1
+_TRANSIENT_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+OPENAI_MAX_CONNECTIONS = 64
+OPENAI_MAX_KEEPALIVE = 32
+CHUNK_ENCODE_BATCH = 64
+HNSW_MIN_VECTORS = 1_000
+IVF_MIN_VECTORS = 10_000
+IVF_MIN_NPROBE = 8
+HNSW_EF_SEARCH = 64
+INDEX_TRAIN_SAMPLE = 50_000
+# PQ codes of <= 64 bytes: PQ training and encoding cost grows with m, and
+# d/8 (PQ384 at 3072 dims) made IVF builds take minutes on one core
+PQ_MAX_SUBQUANTIZERS = 64
+INDEX_ADD_BATCH = 16_384
+INDEX_CACHE_SIZE = 32
+MULTI_KB_MAX_VECTORS = 10_000
+SMALL_KB_MATRIX_BYTES = 4 * 1024 * 1024
+MULTI_INDEX_CACHE_SIZE = 8
+# Byte budgets of the in-memory search caches, per process (so per web
+# worker). Together they hold at most ~256 MB; one entry larger than its
+# budget (e.g. a 10k x 3072-dim combined index, ~60 MB) is still kept alone.
+SMALL_MATRIX_CACHE_BYTES = 64 * 1024 * 1024
+CHUNK_LIST_CACHE_BYTES = 64 * 1024 * 1024
+MULTI_INDEX_CACHE_BYTES = 128 * 1024 * 1024
 
 logger = logging.getLogger(__name__)
 
+# Loaded FAISS indexes keyed by path: {index_path: (mtime, index, meta)}
+_INDEX_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+_INDEX_CACHE_LOCK = threading.Lock()
+
+# AI summaries run here while the KB's chunks are being embedded
+_SUMMARY_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="kb-summary")
+
+# float32 embedding matrices of small KBs: {embeddings_path: (mtime, matrix, nbytes)}
+_SMALL_MATRIX_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Full chunk lists of KBs without chunks.bin: {chunks_path: (mtime, chunks, nbytes)}
+_CHUNK_LIST_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Memory-mapped chunk records keyed by path: {bin_path: (stamp, mmap, offsets)}
+_CHUNK_RECORDS_CACHE: "OrderedDict[str, tuple]" = OrderedDict()
+
+# Combined indexes over several small KBs, keyed by ((kb_id, mtime), ...):
+# {key: ((index, kb_ids, offsets), nbytes)}
+_MULTI_INDEX_CACHE: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def _cache_insert(cache: OrderedDict, key, entry: tuple, max_entries: int, max_bytes: int):
+    """
+    Add entry (whose last item is its size in bytes) to an LRU cache, then
+    evict the least recently used entries until both limits hold again; the
+    new entry itself is always kept. Call with _INDEX_CACHE_LOCK held.
+    """
+    cache[key] = entry
+    cache.move_to_end(key)
+    total = sum(cached[-1] for cached in cache.values())
+    while len(cache) > 1 and (len(cache) > max_entries or total > max_bytes):
+        _, evicted = cache.popitem(last=False)
+        total -= evicted[-1]
+
+# KBs whose legacy pickle files were migrated (or checked and found absent),
+# so searches skip probing for them again
+_MIGRATED: set = set()
+_MIGRATION_LOCK = threading.Lock()
+
+# GPU resources when faiss-gpu is installed and a CUDA device is visible,
+# created on the first index load so processes that import this module
+# without searching (e.g. spawned PDF workers) never claim GPU memory.
+# One StandardGpuResources must not be used from several threads at once.
+_GPU_RESOURCES = None
+_GPU_CHECKED = False
+_GPU_LOCK = threading.Lock()
+
+
+def _gpu_resources():
+    """The shared StandardGpuResources, or None when searching on CPU."""
+    global _GPU_RESOURCES, _GPU_CHECKED
+    with _GPU_LOCK:
+        if not _GPU_CHECKED:
+            _GPU_CHECKED = True
+            try:
+                if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+                    _GPU_RESOURCES = faiss.StandardGpuResources()
+            except Exception as e:
+                print(f"[WARN] FAISS GPU unavailable, searching on CPU: {e}")
+                _GPU_RESOURCES = None
+        return _GPU_RESOURCES
+
 load_dotenv()
 
 def create_embedding(
@@ -62,29 +224,159 @@ def create_embedding(
         api_key = get_provider_api_key("openai", selected_key_name)
         if not api_key:
             raise ValueError("No OpenAI API key configured")
-        client = OpenAI(api_key=api_key)
+        client = get_cached_openai_client(api_key)
         model = model or provider_metadata.get("default_embedding_model", EMBEDDING_MODEL)
         response = client.embeddings.create(input=text, model=model)
         return np.array(response.data[0].embedding, dtype="float32")
     
     elif provider == "gemini":
-        from app.utils.gemini_client import GeminiClient
-        client = GeminiClient(key_name=selected_key_name)
+        from app.utils.gemini_client import get_gemini_client
+        client = get_gemini_client(key_name=selected_key_name)
         model = model or provider_metadata.get("default_embedding_model", "gemini-embedding-001")
         response = client.embed_content(model=model, content=text)
         return np.array(response.data[0]["embedding"], dtype="float32")
     
     raise ValueError(f"Unsupported embedding provider: {provider}")
 
+def _create_gemini_embedding_batch(
+    texts: List[str],
+    model: str = None,
+    key_name: Optional[str] = None,
+) -> np.ndarray:
+    """Embed several texts with one Gemini request; returns rows in input order."""
+    from app.config.provider_config import get_provider_metadata
+    from app.utils.gemini_client import get_gemini_client
+    client = get_gemini_client(key_name=key_name)
+    model = model or get_provider_metadata("gemini").get("default_embedding_model", "gemini-embedding-001")
+    responses = client.embed_contents(model=model, contents=texts)
+    return np.asarray([response.data[0]["embedding"] for response in responses], dtype="float32")
+
+def _create_openai_embedding_batch(
+    texts: List[str],
+    model: str = None,
+    key_name: Optional[str] = None,
+) -> np.ndarray:
+    """Embed several texts with one OpenAI request; returns rows in input order."""
+    from app.config.provider_config import get_provider_metadata
+    client = _get_openai_client(key_name)
+    model = model or get_provider_metadata("openai").get("default_embedding_model", EMBEDDING_MODEL)
+    response = client.embeddings.create(input=texts, model=model)
+    data = sorted(response.data, key=lambda item: item.index)
+    return np.asarray([item.embedding for item in data], dtype="float32")
+
+class _RequestRateLimiter:
+    """Token bucket shared by the embedding worker threads of one provider."""
+
+    def __init__(self, rate_per_second: float):
+        self.rate = rate_per_second
+        self.tokens = rate_per_second
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def _embedding_rate_limiter(provider: str) -> Optional[_RequestRateLimiter]:
+    """Limiter for EMBEDDING_MAX_RPS (requests/second per provider); None when unset."""
+    try:
+        rate = float(os.environ.get("EMBEDDING_MAX_RPS", "") or 0)
+    except ValueError:
+        rate = 0
+    if rate <= 0:
+        return None
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(provider)
+        if limiter is None or limiter.rate != rate:
+            limiter = _RATE_LIMITERS[provider] = _RequestRateLimiter(rate)
+        return limiter
+
+
+def _is_transient_embedding_error(error: Exception) -> bool:
+    """Rate limits, timeouts and 5xx responses are worth retrying; bad input is not."""
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    # openai.APIStatusError exposes status_code, google-genai APIError code
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return status in _TRANSIENT_STATUS_CODES
+
+
+def _create_embedding_batch(
+    texts: List[str],
+    provider: str = "openai",
+    model: str = None,
+    key_name: Optional[str] = None,
+    max_attempts: int = EMBEDDING_MAX_ATTEMPTS,
+) -> np.ndarray:
+    """
+    Embed a batch of texts with a single request to the provider.
+
+    Transient failures are retried with jittered exponential backoff, up to
+    max_attempts requests; once they run out the error is raised, never
+    replaced by zero vectors.
+    """
+    if provider == "openai":
+        embed = _create_openai_embedding_batch
+    elif provider == "gemini":
+        embed = _create_gemini_embedding_batch
+    else:
+        raise ValueError(f"Unsupported embedding provider: {provider}")
+
+    limiter = _embedding_rate_limiter(provider)
+    for attempt in range(1, max_attempts + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return embed(texts, model=model, key_name=key_name)
+        except Exception as e:
+            if attempt == max_attempts or not _is_transient_embedding_error(e):
+                raise
+            delay = min(EMBEDDING_BACKOFF_MAX, EMBEDDING_BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"[WARN] Embedding request failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+@functools.lru_cache(maxsize=4)
+def get_cached_openai_client(api_key: str) -> OpenAI:
+    """
+    One OpenAI client per API key, sharing a pooled httpx transport.
+    HTTP/2 is used when the h2 package is installed so concurrent batches
+    multiplex over one connection.
+    """
+    http_client = DefaultHttpxClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        ),
+    )
+    atexit.register(http_client.close)
+    return OpenAI(api_key=api_key, http_client=http_client)
+
 # Initialize OpenAI client with API key from config
-def _get_openai_client():
-    """Get OpenAI client with proper API key"""
+def _get_openai_client(key_name: Optional[str] = None):
+    """Get OpenAI client with proper API key (reused per key)"""
     try:
         from app.config.provider_config import get_provider_api_key
-        api_key = get_provider_api_key("openai")
+        if key_name in (None, "", "default"):
+            key_name = None
+        api_key = get_provider_api_key("openai", key_name)
         if not api_key:
             raise ValueError("No API key configured")
-        return OpenAI(api_key=api_key)
+        return get_cached_openai_client(api_key)
     except ImportError:
         raise ValueError("API config not available")
 
@@ -111,21 +403,94 @@ def extract_text_from_pdf(file_path):
         with open(file_path, "rb") as file:
             pdf_reader = pypdf.PdfReader(file)
             total_pages = len(pdf_reader.pages)
-            for page_number, page in enumerate(pdf_reader.pages, start=1):
-                try:
-                    page_text = page.extract_text() or ""
-                except Exception as page_error:
-                    print(f"Error extracting text from PDF {file_path} page {page_number}: {page_error}")
-                    continue
-                cleaned_text = page_text.strip()
-                if cleaned_text:
-                    yield cleaned_text
-                if page_number % 25 == 0 or page_number == total_pages:
-                    print(f"📄 Processed {page_number}/{total_pages} PDF pages from {file_path}")
+            workers = min(PDF_MAX_WORKERS, total_pages)
+
+            if workers > 1 and total_pages >= PDF_PARALLEL_MIN_PAGES:
+                # Text extraction is CPU bound; fan pages out across processes.
+                # map() yields in page order. Spawn rather than fork: this runs
+                # on a background thread of a threaded server, and forking while
+                # other threads hold locks (logging, sqlite, httpx) can deadlock.
+                executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=pdf_worker.init_worker,
+                    initargs=(file_path,),
+                )
+                pages = executor.map(
+                    pdf_worker.extract_page,
+                    range(total_pages),
+                    chunksize=max(1, total_pages // (workers * 4)),
+                )
+            else:
+                executor = None
+
+                def extract_sequential():
+                    for page in pdf_reader.pages:
+                        try:
+                            yield page.extract_text() or "", None
+                        except Exception as page_error:
+                            yield "", str(page_error)
+
+                pages = extract_sequential()
+
+            try:
+                for page_number, (page_text, page_error) in enumerate(pages, start=1):
+                    if page_error is not None:
+                        print(f"Error extracting text from PDF {file_path} page {page_number}: {page_error}")
+                        continue
+                    cleaned_text = page_text.strip()
+                    if cleaned_text:
+                        yield cleaned_text
+                    if page_number % 25 == 0 or page_number == total_pages:
+                        print(f"📄 Processed {page_number}/{total_pages} PDF pages from {file_path}")
+            finally:
+                if executor is not None:
+                    executor.shutdown(cancel_futures=True)
     except Exception as e:
         print(f"Error streaming text from PDF {file_path}: {e}")
         return
 
+def _build_url_session() -> requests.Session:
+    """Shared session so repeated URL fetches reuse pooled connections."""
+    session = requests.Session()
+    session.max_redirects = MAX_REDIRECTS
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_URL_SESSION = _build_url_session()
+
+
+# Same boundaries as str.splitlines(), plus runs of two or more spaces
+_PHRASE_BREAK_RE = re.compile(r"[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]+| {2,}")
+
+
+def _html_to_text(content: bytes) -> str:
+    """Visible text of an HTML document, without script/style contents."""
+    if HTMLParser is not None:
+        tree = HTMLParser(content)
+        for node in tree.css("script,style"):
+            node.decompose()
+        text = tree.text(separator="\n")
+    else:
+        soup = BeautifulSoup(content, BS4_PARSER)
+        for script in soup(["script", "style"]):
+            script.decompose()
+        text = soup.get_text()
+    # Clean up whitespace: line breaks and runs of 2+ spaces separate phrases
+    phrases = (phrase.strip() for phrase in _PHRASE_BREAK_RE.split(text))
+    return '\n'.join(phrase for phrase in phrases if phrase)
+
+
 def fetch_content_from_url(url):
     """Fetch content from URL (HTML or JSON)"""
     is_valid, error_message = validate_url_for_ssrf(url)
@@ -133,52 +498,113 @@ def fetch_content_from_url(url):
         raise ValueError(error_message)
 
     try:
+        from app.utils.url_cache import url_cache
+
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
-        session = requests.Session()
-        session.max_redirects = MAX_REDIRECTS
-        response = session.get(url, headers=headers, timeout=30, allow_redirects=True)
-        if len(response.history) > MAX_REDIRECTS:
-            raise ValueError("Too many redirects")
-        response.raise_for_status()
-        
-        content_type = response.headers.get('content-type', '').lower()
-        
+        # Revalidate a previously fetched copy instead of downloading it again;
+        # the stored body is only read when the server answers 304
+        conditional_headers = url_cache.conditional_headers(url)
+        attempts = [{**headers, **conditional_headers}, headers] if conditional_headers else [headers]
+        body = None
+        for request_headers in attempts:
+            with _URL_SESSION.get(
+                url, headers=request_headers, timeout=30, allow_redirects=True, stream=True
+            ) as response:
+                if len(response.history) > MAX_REDIRECTS:
+                    raise ValueError("Too many redirects")
+                response.raise_for_status()
+
+                content_type = response.headers.get('content-type', '').lower()
+                encoding = response.encoding
+
+                if response.status_code == 304:
+                    cached = url_cache.get(url)
+                    if cached is None:
+                        # Stored body missing or corrupt: download it unconditionally
+                        continue
+                    content_type, body = cached
+                    encoding = requests.utils.get_encoding_from_headers({'content-type': content_type})
+                    break
+
+                # Stream the body so an oversized page cannot exhaust memory;
+                # a cut-off page would parse as partial content, so reject it
+                buffer = bytearray()
+                for block in response.iter_content(URL_READ_CHUNK):
+                    buffer.extend(block)
+                    if len(buffer) > URL_MAX_BYTES:
+                        raise ValueError(f"Content truncated: body exceeds {URL_MAX_BYTES} bytes")
+                body = bytes(buffer)
+                if response.status_code == 200:
+                    try:
+                        url_cache.put(url, response.headers, content_type, body)
+                    except OSError as e:
+                        print(f"[WARN] Could not write URL cache: {e}")
+                break
+        if body is None:
+            raise ValueError("Server answered 304 Not Modified without a cached copy")
+
         if 'application/json' in content_type:
-            # Handle JSON content
-            json_data = response.json()
-            return json.dumps(json_data, indent=2)
+            # Handle JSON content (re-indented so chunks stay readable). orjson
+            # only parses: it rejects a BOM, NaN/Infinity and integers past 64
+            # bits, which the stdlib accepts, and formats floats differently, so
+            # the text (and its embeddings) is always written by the stdlib.
+            json_data = None
+            if orjson is not None:
+                try:
+                    json_data = orjson.loads(body)
+                except orjson.JSONDecodeError:
+                    pass
+            if json_data is None:
+                json_data = json.loads(body)
+            return json.dumps(json_data, indent=2, ensure_ascii=False)
         elif 'text/html' in content_type:
-            # Handle HTML content
-            soup = BeautifulSoup(response.content, 'html.parser')
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            # Get text content
-            text = soup.get_text()
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            return text
+            # Handle HTML content (selectolax when installed, else BeautifulSoup)
+            return _html_to_text(body)
         else:
             # Try to get text content anyway
-            return response.text
+            return body.decode(encoding or 'utf-8', errors='replace')
     except Exception as e:
         print(f"Error fetching content from URL: {e}")
         return ""
 
 
+@functools.lru_cache(maxsize=4)
+def _parse_allowlist(raw: str) -> frozenset:
+    return frozenset(item.strip().lower() for item in raw.split(",") if item.strip())
+
+
 def _host_is_allowlisted(hostname: str) -> bool:
-    raw = os.environ.get("ALLOWED_INTERNAL_DOMAINS", "")
-    allowlist = [item.strip().lower() for item in raw.split(",") if item.strip()]
+    # Keyed on the raw value, so changes to the environment still apply
+    allowlist = _parse_allowlist(os.environ.get("ALLOWED_INTERNAL_DOMAINS", ""))
     if not allowlist:
         return False
     hostname = (hostname or "").lower()
     return hostname in allowlist
 
 
+_DNS_CACHE = {}
+_DNS_CACHE_LOCK = threading.Lock()
+
+
+def _resolve_host(hostname: str, port: int) -> frozenset:
+    """getaddrinfo addresses for a host, cached for DNS_CACHE_TTL seconds."""
+    key = (hostname.lower(), port)
+    now = time.monotonic()
+    with _DNS_CACHE_LOCK:
+        cached = _DNS_CACHE.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+    addresses = frozenset(result[4][0] for result in socket.getaddrinfo(hostname, port))
+    with _DNS_CACHE_LOCK:
+        if len(_DNS_CACHE) >= DNS_CACHE_SIZE:
+            _DNS_CACHE.clear()
+        _DNS_CACHE[key] = (now + DNS_CACHE_TTL, addresses)
+    return addresses
+
+
+@functools.lru_cache(maxsize=1024)
 def _is_blocked_ip(ip_text: str) -> bool:
     ip = ipaddress.ip_address(ip_text)
     return (
@@ -209,15 +635,12 @@ def validate_url_for_ssrf(url: str):
         except ValueError:
             # Hostname path: resolve and validate target addresses
             try:
-                resolved_addresses = {
-                    result[4][0] for result in socket.getaddrinfo(hostname, parsed.port or 80)
-                }
+                resolved_addresses = _resolve_host(hostname, parsed.port or 80)
             except socket.gaierror:
                 return False, "Hostname cannot be resolved"
 
-            for addr in resolved_addresses:
-                if _is_blocked_ip(addr) and not _host_is_allowlisted(hostname):
-                    return False, "URL resolves to a private or reserved host"
+            if any(_is_blocked_ip(addr) for addr in resolved_addresses) and not _host_is_allowlisted(hostname):
+                return False, "URL resolves to a private or reserved host"
 
         return True, ""
     except Exception:
@@ -232,18 +655,176 @@ def _validate_chunks(chunks):
             raise ValueError(f"Chunk {idx} must be a string, got {type(item).__name__}")
 
 
-def _write_chunks_json_gz(chunks, path):
-    _validate_chunks(chunks)
-    with gzip.open(path, "wt", encoding="utf-8") as f:
-        json.dump(chunks, f, ensure_ascii=False)
+def _write_chunks_json_gz(chunks: Iterable[str], path):
+    """Write chunks as a gzipped JSON array, one item at a time."""
+    # Chunk text is rewritten on every build; favour speed over ratio
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=CHUNKS_GZIP_LEVEL) as f:
+        f.write("[")
+        for idx, item in enumerate(chunks):
+            if not isinstance(item, str):
+                raise ValueError(f"Chunk {idx} must be a string, got {type(item).__name__}")
+            if idx:
+                f.write(", ")
+            f.write(json.dumps(item, ensure_ascii=False))
+        f.write("]")
+
+
+def _find_chunks_path(kb_folder) -> Optional[str]:
+    """
+    Return the current (non-pickle) chunk file of a KB folder, if any.
+
+    chunks.bin (with its chunks.idx offsets) is the store for KBs built now;
+    chunks.msgpack.zst and chunks.json.gz are only read for older KBs and
+    for migrated pickles.
+    """
+    if os.path.exists(os.path.join(kb_folder, CHUNKS_IDX)):
+        bin_path = os.path.join(kb_folder, CHUNKS_BIN)
+        if os.path.exists(bin_path):
+            return bin_path
+    for filename in (CHUNKS_MSGPACK_ZST, CHUNKS_JSON_GZ):
+        path = os.path.join(kb_folder, filename)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _append_chunk_record(f, text: str) -> int:
+    """Append one [uint32 length][utf-8 bytes] record and return its offset."""
+    data = text.encode("utf-8")
+    offset = f.tell()
+    f.write(struct.pack("<I", len(data)))
+    f.write(data)
+    return offset
+
+
+def _open_chunk_records(kb_folder):
+    """
+    Map a KB's chunks.bin and chunks.idx once per process, reusing the maps
+    until either file changes. Returns (data, offsets), or None when the KB
+    has no record files.
+    """
+    bin_path = os.path.join(kb_folder, CHUNKS_BIN)
+    idx_path = os.path.join(kb_folder, CHUNKS_IDX)
+    if not os.path.exists(bin_path) or not os.path.exists(idx_path):
+        return None
+    stamp = (os.path.getmtime(bin_path), os.path.getmtime(idx_path))
+    with _INDEX_CACHE_LOCK:
+        cached = _CHUNK_RECORDS_CACHE.get(bin_path)
+        if cached and cached[0] == stamp:
+            _CHUNK_RECORDS_CACHE.move_to_end(bin_path)
+            return cached[1], cached[2]
+
+    offsets = np.load(idx_path, mmap_mode="r", allow_pickle=False)
+    with open(bin_path, "rb") as f:
+        # mmap cannot map an empty file; an empty KB has nothing to read anyway
+        if os.fstat(f.fileno()).st_size == 0:
+            data = b""
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    with _INDEX_CACHE_LOCK:
+        # Evicted maps are closed by garbage collection once no reader holds them
+        _CHUNK_RECORDS_CACHE[bin_path] = (stamp, data, offsets)
+        _CHUNK_RECORDS_CACHE.move_to_end(bin_path)
+        while len(_CHUNK_RECORDS_CACHE) > INDEX_CACHE_SIZE:
+            _CHUNK_RECORDS_CACHE.popitem(last=False)
+    return data, offsets
+
+
+def _count_chunks(kb_folder) -> Optional[int]:
+    """
+    Number of chunks in a KB, read from the header of chunks.idx or
+    embeddings.npy (memory-mapped, so no vector or text data is loaded).
+    Returns None when neither file exists.
+    """
+    for filename in (CHUNKS_IDX, "embeddings.npy"):
+        path = os.path.join(kb_folder, filename)
+        if os.path.exists(path):
+            return int(np.load(path, mmap_mode="r", allow_pickle=False).shape[0])
+    return None
+
+
+def count_kb_chunks(kb_folder) -> Optional[int]:
+    """
+    Number of chunks in a KB folder for listings, or None when it has none
+    (or they cannot be read). Current KBs answer from a file header; KBs
+    without chunks.idx or embeddings.npy load their chunk list, including
+    legacy pickles.
+    """
+    try:
+        count = _count_chunks(kb_folder)
+    except Exception:
+        count = None
+    if count is not None:
+        return count
+    chunks_path = _find_chunks_path(kb_folder)
+    if chunks_path is None:
+        chunks_path = next(
+            (
+                os.path.join(kb_folder, filename)
+                for filename in (LEGACY_CHUNKS_GZ, LEGACY_CHUNKS_RAW)
+                if os.path.exists(os.path.join(kb_folder, filename))
+            ),
+            None,
+        )
+    if chunks_path is None:
+        return None
+    try:
+        chunks = _load_chunks_safe(chunks_path, allow_legacy_pickle=chunks_path.endswith((".pkl", ".pkl.gz")))
+    except Exception:
+        return None
+    return len(chunks)
+
+
+def _read_chunk_records(kb_folder, positions) -> Optional[List[Optional[str]]]:
+    """
+    Read only the requested chunks from chunks.bin via the chunks.idx offsets.
+    
+    Positions outside the KB (including FAISS -1 padding) come back as None.
+    Returns None when the KB has no record files, so callers can fall back to
+    loading the full chunk list.
+    """
+    records = _open_chunk_records(kb_folder)
+    if records is None:
+        return None
+
+    data, offsets = records
+    results: List[Optional[str]] = []
+    for position in positions:
+        if not 0 <= position < offsets.shape[0]:
+            results.append(None)
+            continue
+        offset = int(offsets[position])
+        (length,) = struct.unpack_from("<I", data, offset)
+        start = offset + 4
+        results.append(bytes(data[start : start + length]).decode("utf-8"))
+    return results
 
 
 def _load_chunks_safe(chunks_path, allow_legacy_pickle=False):
     """Load chunks safely and validate shape."""
     try:
+        if os.path.basename(chunks_path) == CHUNKS_BIN:
+            kb_folder = os.path.dirname(chunks_path)
+            chunks = _read_chunk_records(kb_folder, range(_count_chunks(kb_folder) or 0))
+            if chunks is None:
+                raise ValueError(f"{CHUNKS_IDX} is missing next to {chunks_path}")
+            return chunks
+
+        if chunks_path.endswith(".msgpack.zst"):
+            if msgpack is None or zstandard is None:
+                raise ValueError("zstandard and msgpack are required to read this KB")
+            with open(chunks_path, "rb") as raw, \
+                    zstandard.ZstdDecompressor().stream_reader(raw) as f:
+                chunks = list(msgpack.Unpacker(f, raw=False))
+            _validate_chunks(chunks)
+            return chunks
+
         if chunks_path.endswith(".json.gz"):
-            with gzip.open(chunks_path, "rt", encoding="utf-8") as f:
-                chunks = json.load(f)
+            # Decompress in one call and parse the bytes directly rather
+            # than streaming through a line-buffered text wrapper
+            with open(chunks_path, "rb") as f:
+                chunks = json.loads(gzip.decompress(f.read()))
             _validate_chunks(chunks)
             return chunks
 
@@ -265,24 +846,70 @@ def _load_chunks_safe(chunks_path, allow_legacy_pickle=False):
 
 
 def _migrate_legacy_chunks_to_json(kb_id):
-    """Migrate legacy pickle chunk files to JSON gz format."""
+    """
+    Migrate legacy pickle chunk files to chunks.json.gz.
+
+    Runs at most once per KB: the conversion holds a process lock plus a file
+    lock (where supported) and removes the pickle once the new file is written.
+    The target is always json.gz so the result never depends on optional
+    packages being installed.
+    """
     kb_folder = f"app/knowledge_bases/{kb_id}"
-    target_path = os.path.join(kb_folder, CHUNKS_JSON_GZ)
-    if os.path.exists(target_path):
-        return target_path
+    if kb_id in _MIGRATED:
+        return _find_chunks_path(kb_folder)
 
     legacy_candidates = [
         os.path.join(kb_folder, LEGACY_CHUNKS_GZ),
         os.path.join(kb_folder, LEGACY_CHUNKS_RAW),
     ]
-    for legacy_path in legacy_candidates:
-        if not os.path.exists(legacy_path):
-            continue
-        chunks = _load_chunks_safe(legacy_path, allow_legacy_pickle=True)
-        _write_chunks_json_gz(chunks, target_path)
-        logger.warning("Migrated legacy chunks format for KB %s", kb_id)
-        return target_path
-    return None
+    with _MIGRATION_LOCK:
+        existing_path = _find_chunks_path(kb_folder)
+        if existing_path or not any(os.path.exists(path) for path in legacy_candidates):
+            # Already converted, or nothing to convert: don't probe again
+            _MIGRATED.add(kb_id)
+            return existing_path
+
+        lock_path = os.path.join(kb_folder, ".migrate.lock")
+        lock_file = open(lock_path, "w")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have finished the migration while we waited
+            existing_path = _find_chunks_path(kb_folder)
+            if existing_path:
+                _MIGRATED.add(kb_id)
+                return existing_path
+
+            target_path = os.path.join(kb_folder, CHUNKS_JSON_GZ)
+            for legacy_path in legacy_candidates:
+                if not os.path.exists(legacy_path):
+                    continue
+                chunks = _load_chunks_safe(legacy_path, allow_legacy_pickle=True)
+                tmp_path = target_path + ".tmp"
+                _write_chunks_json_gz(chunks, tmp_path)
+                os.replace(tmp_path, target_path)
+                for stale_path in legacy_candidates:
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+                logger.warning("Migrated legacy chunks format for KB %s", kb_id)
+                _MIGRATED.add(kb_id)
+                return target_path
+            return None
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            # Waiters re-check for the migrated file after locking, so removing
+            # the lock file here cannot cause a second conversion
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+@functools.lru_cache(maxsize=8)
+def get_token_encoding(encoding_name: str = "cl100k_base"):
+    """Return a tiktoken encoding, resolved once per process."""
+    return tiktoken.get_encoding(encoding_name)
 
 def chunk_text(
     text_stream: Iterable[str],
@@ -301,88 +928,316 @@ def chunk_text(
 
     if not tiktoken:
         print("[WARN] tiktoken not installed; falling back to character-based chunking")
-        buffer = ""
+        # Collect segments and only join once a window is full; windows are
+        # cut at a moving offset, so the carried tail stays under max_tokens
+        stride = max_tokens - overlap_tokens
+        parts: List[str] = []
+        length = 0
         for segment in text_stream:
             if not segment:
                 continue
-            buffer += segment
-            while len(buffer) >= max_tokens:
-                chunk = buffer[:max_tokens]
-                yield chunk
-                buffer = buffer[max_tokens - overlap_tokens :]
-        if buffer:
-            yield buffer
+            parts.append(segment)
+            length += len(segment)
+            if length < max_tokens:
+                continue
+            buffer = "".join(parts)
+            start = 0
+            while len(buffer) - start >= max_tokens:
+                yield buffer[start : start + max_tokens]
+                start += stride
+            tail = buffer[start:]
+            parts = [tail]
+            length = len(tail)
+        if length:
+            yield "".join(parts)
         return
 
-    encoding = tiktoken.get_encoding(encoding_name)
-    token_buffer: List[int] = []
-    for segment in text_stream:
-        if not segment:
-            continue
-        segment_tokens = encoding.encode(segment)
-        token_buffer.extend(segment_tokens)
+    encoding = get_token_encoding(encoding_name)
+    stride = max_tokens - overlap_tokens
+    carry = np.empty(0, dtype=np.int32)
 
-        while len(token_buffer) >= max_tokens:
-            chunk_tokens = token_buffer[:max_tokens]
-            yield encoding.decode(chunk_tokens)
-            token_buffer = token_buffer[max_tokens - overlap_tokens :]
+    def windows(tokens: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        # Fixed-stride views over the token array; whatever follows the last
+        # full window carries over to the next batch of segments.
+        if tokens.shape[0] < max_tokens:
+            return [], tokens
+        count = (tokens.shape[0] - max_tokens) // stride + 1
+        chunks = encoding.decode_batch(
+            [tokens[i * stride : i * stride + max_tokens].tolist() for i in range(count)]
+        )
+        return chunks, tokens[count * stride :]
 
-    if token_buffer:
-        yield encoding.decode(token_buffer)
+    segment_iter = (segment for segment in text_stream if segment)
+    while True:
+        segments = list(islice(segment_iter, CHUNK_ENCODE_BATCH))
+        if not segments:
+            break
+        encoded = encoding.encode_ordinary_batch(segments)
+        tokens = np.concatenate(
+            [carry] + [np.asarray(ids, dtype=np.int32) for ids in encoded]
+        )
+        chunks, carry = windows(tokens)
+        yield from chunks
+
+    if carry.shape[0]:
+        yield encoding.decode(carry.tolist())
 
-def create_embeddings(
-    chunks: List[str],
+def iter_embedding_batches(
+    chunks: Iterable[str],
     batch_size: int = 32,
     provider: str = "openai",
     model: str = None,
     key_name: Optional[str] = None,
-) -> np.ndarray:
+    use_cache: bool = True,
+) -> Iterator[Tuple[List[str], np.ndarray]]:
     """
-    Create embeddings for text chunks in batches.
+    Embed a stream of text chunks, yielding (batch_chunks, batch_embeddings).
     
-    Args:
-        chunks: List of text chunks to embed
-        batch_size: Number of chunks per API call
-        provider: Embedding provider ("openai" or "gemini")
-        model: Optional specific model name
-        
-    Returns:
-        numpy array of embeddings
+    Chunks are pulled from the iterable one batch at a time, so only the
+    batches currently in flight are held in memory. Batches are yielded in
+    input order.
     """
-    if not chunks:
-        # Get default dimension for provider
-        from app.config.provider_config import get_provider_metadata
-        default_dim = get_provider_metadata(provider).get("embedding_dimensions", DEFAULT_EMBEDDING_DIM)
-        return np.zeros((0, default_dim), dtype="float32")
+    from app.config.provider_config import get_provider_metadata
+    model = model or get_provider_metadata(provider).get(
+        "default_embedding_model",
+        "gemini-embedding-001" if provider == "gemini" else EMBEDDING_MODEL,
+    )
+    if use_cache:
+        from app.utils.embedding_cache import embedding_cache, embedding_cache_key
 
-    embeddings: List[np.ndarray] = []
-    total_chunks = len(chunks)
-    embedding_dim = None
+    # Both providers accept a list of inputs per request
+    max_batch = GEMINI_MAX_EMBED_BATCH if provider == "gemini" else OPENAI_MAX_EMBED_BATCH
+    step = max(1, min(batch_size, max_batch))
 
-    # For Gemini, we need to embed one at a time (no batch support in wrapper yet)
-    # For OpenAI, we can batch but use individual calls for consistency
-    for idx, chunk in enumerate(chunks, 1):
-        try:
-            vector = create_embedding(
-                chunk,
-                provider=provider,
-                model=model,
-                key_name=key_name,
-            )
-            if embedding_dim is None:
-                embedding_dim = vector.shape[0]
-            embeddings.append(vector)
-        except Exception as e:
-            raise RuntimeError(
-                f"Embedding failed for provider '{provider}' at chunk {idx}/{total_chunks}: {e}"
-            ) from e
+    def embed_batch(batch: List[str], offset: int) -> Tuple[np.ndarray, int]:
+        cache_keys: List[str] = []
+        cached = {}
+        if use_cache:
+            # Reuse vectors for chunk text this model has already embedded
+            cache_keys = [embedding_cache_key(provider, model, chunk) for chunk in batch]
+            try:
+                cached = embedding_cache.get_many(cache_keys)
+            except Exception as e:
+                print(f"[WARN] Embedding cache unavailable: {e}")
+
+        misses = [idx for idx in range(len(batch)) if not cached or cache_keys[idx] not in cached]
+        fetched: Optional[np.ndarray] = None
+        if misses:
+            # Repeated boilerplate (headers, nav text) is sent once per batch
+            unique_texts = list(dict.fromkeys(batch[idx] for idx in misses))
+            try:
+                unique_vectors = _create_embedding_batch(
+                    unique_texts,
+                    provider=provider,
+                    model=model,
+                    key_name=key_name,
+                )
+            except Exception as e:
+                if len(unique_texts) == 1:
+                    raise RuntimeError(
+                        f"Embedding failed for provider '{provider}' at chunks "
+                        f"{offset + 1}-{offset + len(batch)}: {e}"
+                    ) from e
+                # One bad input fails the whole request; retry item by item
+                # so the error names the offending chunk
+                print(f"[WARN] Embedding batch at chunk {offset + 1} failed, retrying per chunk: {e}")
+                rows = []
+                for text in unique_texts:
+                    try:
+                        rows.append(
+                            _create_embedding_batch(
+                                [text], provider=provider, model=model, key_name=key_name
+                            )
+                        )
+                    except Exception as item_error:
+                        chunk_number = offset + batch.index(text) + 1
+                        raise RuntimeError(
+                            f"Embedding failed for provider '{provider}' at chunk "
+                            f"{chunk_number}: {item_error}"
+                        ) from item_error
+                unique_vectors = np.concatenate(rows)
+            if len(unique_texts) == len(misses):
+                fetched = unique_vectors
+            else:
+                row_of = {text: row for row, text in enumerate(unique_texts)}
+                fetched = unique_vectors[[row_of[batch[idx]] for idx in misses]]
+            if len(misses) == len(batch):
+                # Nothing cached: the response matrix is already the block
+                block = fetched
+            if use_cache:
+                try:
+                    embedding_cache.put_many(
+                        {cache_keys[idx]: vector for idx, vector in zip(misses, fetched)}
+                    )
+                except Exception as e:
+                    print(f"[WARN] Could not write embedding cache: {e}")
 
-        print(f"🧠 Embedded {idx}/{total_chunks} chunks")
+        if len(misses) == len(batch):
+            return block, 0
 
-    if not embeddings:
-        return np.zeros((0, embedding_dim or DEFAULT_EMBEDDING_DIM), dtype="float32")
+        # Mix of cache hits and fresh rows: fill one preallocated block
+        dimension = next(iter(cached.values())).shape[0]
+        block = np.empty((len(batch), dimension), dtype="float32")
+        hits = [idx for idx, key in enumerate(cache_keys) if key in cached]
+        block[hits] = np.stack([cached[cache_keys[idx]] for idx in hits])
+        if fetched is not None:
+            block[misses] = fetched
+        return block, len(hits)
+
+    chunk_iter = iter(chunks)
+    in_flight = deque()
+    embedded = 0
+    reused = 0
+    offset = 0
+    # Requests are I/O bound: keep a few batches in flight
+    with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_WORKERS, thread_name_prefix="embed") as executor:
+        while True:
+            while len(in_flight) < EMBEDDING_MAX_WORKERS:
+                batch = list(islice(chunk_iter, step))
+                if not batch:
+                    break
+                in_flight.append((batch, executor.submit(embed_batch, batch, offset)))
+                offset += len(batch)
+            if not in_flight:
+                break
+            batch, future = in_flight.popleft()
+            block, batch_reused = future.result()
+            embedded += len(batch)
+            reused += batch_reused
+            print(f"🧠 Embedded {embedded} chunks ({reused} from cache)")
+            yield batch, block
+
+def _pq_subquantizers(dimension: int, target: Optional[int] = None) -> int:
+    """
+    Largest PQ sub-quantizer count <= target that divides the dimension.
+    The default target is d/8, capped at PQ_MAX_SUBQUANTIZERS.
+    """
+    target = target or max(1, min(dimension // 8, PQ_MAX_SUBQUANTIZERS))
+    for m in range(min(target, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+def _build_faiss_index(embeddings: np.ndarray):
+    """
+    Build the search index for a KB, sized to the number of vectors.
+
+    - small KBs: exhaustive search over 8-bit scalar-quantized vectors (SQ8)
+    - medium KBs: HNSW graph over SQ8 vectors for sub-linear search
+    - large KBs: IVF-PQ, which also compresses vectors to a few bytes each
+
+    Vectors must already be L2-normalized: the index ranks by inner product,
+    i.e. cosine similarity. They may be a float16 memmap; training uses an
+    evenly strided sample and rows are added in batches, so only one batch
+    is converted to float32 at a time.
+
+    Returns (index, meta); meta is persisted next to the index so search
+    can apply the matching query-time parameters and metric.
+    """
+    count, dimension = embeddings.shape
+    search_params = {}
+    if count >= IVF_MIN_VECTORS:
+        # ~4*sqrt(N) lists, capped so each keeps ~39 training points
+        train_count = min(count, INDEX_TRAIN_SAMPLE)
+        nlist = max(1, min(int(4 * np.sqrt(count)), train_count // 39))
+        factory = f"IVF{nlist},PQ{_pq_subquantizers(dimension)}x8"
+        search_params["nprobe"] = max(IVF_MIN_NPROBE, nlist // 32)
+    elif count >= HNSW_MIN_VECTORS:
+        factory = "HNSW32,SQ8"
+        search_params["efSearch"] = HNSW_EF_SEARCH
+    else:
+        factory = "SQ8"
 
-    return np.vstack(embeddings)
+    index = faiss.index_factory(dimension, factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        if factory.startswith("IVF"):
+            # index_factory enables polysemous training for IVF-PQ; searches never
+            # use polysemous codes, and the training was most of the build time
+            faiss.downcast_index(faiss.extract_index_ivf(index)).do_polysemous_training = False
+        # Ceiling division so the stride spans the whole matrix instead of
+        # sampling only its head when count is not a multiple of the sample
+        step = max(1, -(-count // INDEX_TRAIN_SAMPLE))
+        index.train(np.ascontiguousarray(embeddings[::step][:INDEX_TRAIN_SAMPLE], dtype="float32"))
+    for start in range(0, count, INDEX_ADD_BATCH):
+        index.add(np.ascontiguousarray(embeddings[start : start + INDEX_ADD_BATCH], dtype="float32"))
+    meta = {
+        "factory": factory,
+        "metric": "ip",
+        "search_params": search_params,
+    }
+    return index, meta
+
+def _write_index_meta(kb_folder: str, meta: dict):
+    meta_path = os.path.join(kb_folder, INDEX_META_JSON)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+def _index_stamp(kb_folder: str) -> tuple:
+    """mtimes of index.faiss and index_meta.json (0 when the meta file is absent)."""
+    index_mtime = os.path.getmtime(os.path.join(kb_folder, "index.faiss"))
+    try:
+        meta_mtime = os.path.getmtime(os.path.join(kb_folder, INDEX_META_JSON))
+    except OSError:
+        meta_mtime = 0
+    return index_mtime, meta_mtime
+
+def _load_index_meta(kb_folder: str) -> dict:
+    """Index metadata; KBs built before it existed are flat L2 indexes."""
+    meta_path = os.path.join(kb_folder, INDEX_META_JSON)
+    if not os.path.exists(meta_path):
+        return {"factory": "Flat", "metric": "l2", "search_params": {}}
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _apply_search_params(index, meta: dict, on_gpu: bool = False):
+    params = meta.get("search_params") or {}
+    if not params:
+        return
+    parameter_space = faiss.GpuParameterSpace() if on_gpu else faiss.ParameterSpace()
+    for name, value in params.items():
+        parameter_space.set_index_parameter(index, name, value)
+
+def _open_index(kb_folder: str):
+    """
+    Load a KB's FAISS index once per process and reuse it until the index or
+    its metadata changes. IVF indexes are memory-mapped so their inverted
+    lists are paged in on demand.
+
+    Returns (index, meta).
+    """
+    index_path = os.path.join(kb_folder, "index.faiss")
+    # Keyed on both files, so a load that races a rebuild is replaced on the next search
+    stamp = _index_stamp(kb_folder)
+    with _INDEX_CACHE_LOCK:
+        cached = _INDEX_CACHE.get(index_path)
+        if cached and cached[0] == stamp:
+            _INDEX_CACHE.move_to_end(index_path)
+            return cached[1], cached[2]
+
+    meta = _load_index_meta(kb_folder)
+    gpu_resources = _gpu_resources()
+    if gpu_resources is not None:
+        index = faiss.read_index(index_path)
+        try:
+            index = faiss.index_cpu_to_gpu(gpu_resources, 0, index)
+            meta["on_gpu"] = True
+        except Exception as e:
+            # e.g. HNSW has no GPU implementation
+            logger.info("Keeping %s on CPU: %s", index_path, e)
+    elif meta.get("factory", "").startswith("IVF"):
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    else:
+        index = faiss.read_index(index_path)
+    _apply_search_params(index, meta, on_gpu=meta.get("on_gpu", False))
+
+    with _INDEX_CACHE_LOCK:
+        _INDEX_CACHE[index_path] = (stamp, index, meta)
+        _INDEX_CACHE.move_to_end(index_path)
+        while len(_INDEX_CACHE) > INDEX_CACHE_SIZE:
+            _INDEX_CACHE.popitem(last=False)
+    return index, meta
 
 def generate_ai_summary(text, title="", source_type="document"):
     """Generate an AI summary/description of the knowledge base content"""
@@ -425,6 +1280,48 @@ Keep it concise but informative. Focus on the practical value and scope of the c
 # Legacy web scraping functions removed - now using direct OpenAI approach for better results
 
 
+def _prefetch(iterable: Iterable[str], maxsize: int = PREFETCH_SEGMENTS) -> Iterator[str]:
+    """
+    Pull items from an iterable on a background thread, up to maxsize ahead.
+    Exceptions from the producer are re-raised in the consumer.
+    """
+    items: "queue.Queue" = queue.Queue(maxsize=maxsize)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        # Poll so an abandoned consumer (full queue, nobody reading) cannot block us forever
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+
+    producer = threading.Thread(target=produce, name="kb-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Consumer stopped early (error or abandoned generator): release the producer
+        stop.set()
+
 def process_knowledge_base(kb_id, kb_type, source_path, generate_summary=False, embedding_provider="openai", embedding_model=None):
     """
     Process a knowledge base and create embeddings.
@@ -495,11 +1392,24 @@ def process_knowledge_base(kb_id, kb_type, source_path, generate_summary=False,
         if text_iterator is None:
             print(f"No text iterator available for {source_path}")
             return False, None
+        if kb_type == "file":
+            # Parse the next pages while the current batches are being embedded
+            text_iterator = _prefetch(text_iterator)
         
         segments_emitted = 0
         summary_char_limit = 8000
         summary_buffer: List[str] = []
         summary_chars = 0
+        summary_future = None
+        title = kb_info.get('title', '') if kb_info else ""
+
+        def start_summary():
+            # Runs alongside embedding; the two API calls are independent
+            nonlocal summary_future
+            if summary_future is None:
+                summary_future = _SUMMARY_EXECUTOR.submit(
+                    generate_ai_summary, "".join(summary_buffer), title, kb_type
+                )
 
         def streaming_segments() -> Iterator[str]:
             nonlocal segments_emitted, summary_chars
@@ -512,49 +1422,100 @@ def process_knowledge_base(kb_id, kb_type, source_path, generate_summary=False,
                     snippet = segment[:remaining]
                     summary_buffer.append(snippet)
                     summary_chars += len(snippet)
+                    if summary_chars >= summary_char_limit:
+                        start_summary()
                 yield segment
 
-        chunk_iter = chunk_text(streaming_segments())
-        chunks = list(chunk_iter)
-
-        if segments_emitted == 0 or not chunks:
-            print(f"No text chunks produced from {source_path}")
-            return False, None
-        
-        print(f"🧩 Generated {len(chunks)} chunks for knowledge base {kb_id}")
-        
-        # Generate AI summary if requested
-        ai_summary = None
-        if generate_summary:
-            title = kb_info.get('title', '') if kb_info else ""
-            summary_text = "".join(summary_buffer)
-            ai_summary = generate_ai_summary(summary_text, title, kb_type)
-        
-        # Create embeddings
-        embeddings = create_embeddings(chunks, provider=embedding_provider, model=embedding_model)
-        
-        if embeddings.size == 0:
-            print(f"No embeddings generated for {kb_id}")
-            return False, ai_summary
-
-        # Save checkpoints prior to index build
         kb_folder = f"app/knowledge_bases/{kb_id}"
         os.makedirs(kb_folder, exist_ok=True)
         
         index_path = f"{kb_folder}/index.faiss"
-        chunks_path = f"{kb_folder}/{CHUNKS_JSON_GZ}"
         embeddings_path = f"{kb_folder}/embeddings.npy"
         
-        _write_chunks_json_gz(chunks, chunks_path)
-        np.save(embeddings_path, embeddings)
+        # Stream chunks through the embedder and straight to disk; the chunk
+        # list is never materialized. chunks.bin (length-prefixed records) and
+        # chunks.idx (their offsets) are the KB's only copy of the chunk text,
+        # read a few records at a time at search time. Everything is written
+        # to temp files so a failed run leaves the previous build in place.
+        # Vectors are normalized per batch (so the index can rank by inner
+        # product, i.e. cosine) and spilled to disk as float16 rows, so the
+        # full embedding matrix is never held in memory.
+        record_offsets: List[int] = []
+        records_path = f"{kb_folder}/{CHUNKS_BIN}"
+        offsets_path = f"{kb_folder}/{CHUNKS_IDX}"
+        dimension = 0
+
+        tmp_records_path = f"{records_path}.tmp"
+        tmp_offsets_path = f"{offsets_path}.tmp"
+        tmp_vectors_path = f"{embeddings_path}.raw.tmp"
+        tmp_embeddings_path = f"{embeddings_path}.tmp"
+        try:
+            with open(tmp_records_path, "wb") as records_file, \
+                    open(tmp_vectors_path, "wb") as vectors_file:
+                for batch, block in iter_embedding_batches(
+                    chunk_text(streaming_segments()),
+                    provider=embedding_provider,
+                    model=embedding_model,
+                ):
+                    block = np.ascontiguousarray(block, dtype="float32")
+                    faiss.normalize_L2(block)
+                    dimension = block.shape[1]
+                    vectors_file.write(block.astype(np.float16).tobytes())
+                    for chunk in batch:
+                        record_offsets.append(_append_chunk_record(records_file, chunk))
+            vector_count = len(record_offsets)
+            if segments_emitted == 0 or vector_count == 0:
+                print(f"No text chunks produced from {source_path}")
+                return False, None
+
+            # float16 halves the checkpoint size; the index keeps its own copy
+            vectors = np.memmap(tmp_vectors_path, dtype=np.float16, mode="r", shape=(vector_count, dimension))
+            saved = np.lib.format.open_memmap(
+                tmp_embeddings_path, mode="w+", dtype=np.float16, shape=(vector_count, dimension)
+            )
+            for start in range(0, vector_count, INDEX_ADD_BATCH):
+                saved[start : start + INDEX_ADD_BATCH] = vectors[start : start + INDEX_ADD_BATCH]
+            saved.flush()
+            del saved, vectors
+            os.replace(tmp_embeddings_path, embeddings_path)
+            with open(tmp_offsets_path, "wb") as f:
+                np.save(f, np.asarray(record_offsets, dtype=np.int64), allow_pickle=False)
+            # Release a cached map first; Windows cannot replace a mapped file
+            with _INDEX_CACHE_LOCK:
+                _CHUNK_RECORDS_CACHE.pop(os.path.join(kb_folder, CHUNKS_BIN), None)
+            os.replace(tmp_records_path, records_path)
+            os.replace(tmp_offsets_path, offsets_path)
+            # Drop chunk lists written by builds from before chunks.bin was the store
+            for filename in (CHUNKS_MSGPACK_ZST, CHUNKS_JSON_GZ):
+                stale_path = f"{kb_folder}/{filename}"
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+        finally:
+            for tmp_path in (tmp_records_path, tmp_offsets_path, tmp_vectors_path, tmp_embeddings_path):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        print(f"🧩 Generated {vector_count} chunks for knowledge base {kb_id}")
+        
+        # Short sources never reach the cap; summarize what was collected
+        if generate_summary:
+            start_summary()
 
-        # Create FAISS index
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
-        index.add(embeddings)
+        # Create FAISS index from the memory-mapped checkpoint
+        embeddings = np.load(embeddings_path, mmap_mode="r", allow_pickle=False)
+        index, index_meta = _build_faiss_index(embeddings)
+        del embeddings
         
-        faiss.write_index(index, index_path)
+        # Metadata first, then the index swapped in whole, so a search never
+        # reads a half-written index or pairs a new index with stale metadata
+        _write_index_meta(kb_folder, index_meta)
+        faiss.write_index(index, f"{index_path}.tmp")
+        # Release a cached (possibly memory-mapped) index; Windows cannot replace a mapped file
+        with _INDEX_CACHE_LOCK:
+            _INDEX_CACHE.pop(index_path, None)
+        os.replace(f"{index_path}.tmp", index_path)
         
+        ai_summary = summary_future.result() if summary_future is not None else None
         print(f"Successfully processed knowledge base {kb_id}")
         return True, ai_summary
         
@@ -563,6 +1524,172 @@ def process_knowledge_base(kb_id, kb_type, source_path, generate_summary=False,
         return False, None
 
 
+def _load_chunks_cached(chunks_path) -> List[str]:
+    """Load a chunk list once per process and reuse it until the file changes."""
+    mtime = os.path.getmtime(chunks_path)
+    with _INDEX_CACHE_LOCK:
+        cached = _CHUNK_LIST_CACHE.get(chunks_path)
+        if cached and cached[0] == mtime:
+            _CHUNK_LIST_CACHE.move_to_end(chunks_path)
+            return cached[1]
+
+    chunks = _load_chunks_safe(chunks_path, allow_legacy_pickle=False)
+
+    nbytes = sum(sys.getsizeof(chunk) for chunk in chunks)
+    with _INDEX_CACHE_LOCK:
+        _cache_insert(
+            _CHUNK_LIST_CACHE, chunks_path, (mtime, chunks, nbytes), INDEX_CACHE_SIZE, CHUNK_LIST_CACHE_BYTES
+        )
+    return chunks
+
+def _read_chunks_at(kb_folder, chunks_path, positions) -> List[Optional[str]]:
+    """Read just the hits; KBs built before chunks.bin use a cached full list."""
+    hits = _read_chunk_records(kb_folder, positions)
+    if hits is None:
+        chunks = _load_chunks_cached(chunks_path)
+        hits = [chunks[i] if 0 <= i < len(chunks) else None for i in positions]
+    return hits
+
+def _open_multi_index(kb_ids: List[str]):
+    """
+    Exhaustive index over the normalized embeddings of several KBs.
+    
+    Returns (index, kb_ids, offsets) where offsets[i] is the first global row
+    of kb_ids[i], or None when the KBs cannot share one index (legacy L2
+    KBs, mixed dimensions, missing files or too many vectors in total).
+    """
+    sources = []
+    for kb_id in kb_ids:
+        kb_folder = f"app/knowledge_bases/{kb_id}"
+        embeddings_path = f"{kb_folder}/embeddings.npy"
+        if not os.path.exists(embeddings_path) or not _find_chunks_path(kb_folder):
+            return None
+        if _load_index_meta(kb_folder).get("metric") != "ip":
+            return None
+        sources.append((kb_id, embeddings_path, os.path.getmtime(embeddings_path)))
+
+    cache_key = tuple((kb_id, mtime) for kb_id, _, mtime in sources)
+    with _INDEX_CACHE_LOCK:
+        cached = _MULTI_INDEX_CACHE.get(cache_key)
+        if cached:
+            _MULTI_INDEX_CACHE.move_to_end(cache_key)
+            return cached[0]
+
+    arrays = [np.load(path, mmap_mode="r", allow_pickle=False) for _, path, _ in sources]
+    if len({array.shape[1] for array in arrays}) != 1:
+        return None
+    counts = [array.shape[0] for array in arrays]
+    if sum(counts) > MULTI_KB_MAX_VECTORS:
+        return None
+
+    index = faiss.IndexScalarQuantizer(
+        arrays[0].shape[1], faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT
+    )
+    for array in arrays:
+        index.add(np.ascontiguousarray(array, dtype="float32"))
+    offsets = np.cumsum([0] + counts[:-1])
+    entry = (index, [kb_id for kb_id, _, _ in sources], offsets)
+
+    nbytes = index.ntotal * index.code_size
+    with _INDEX_CACHE_LOCK:
+        _cache_insert(
+            _MULTI_INDEX_CACHE, cache_key, (entry, nbytes), MULTI_INDEX_CACHE_SIZE, MULTI_INDEX_CACHE_BYTES
+        )
+    return entry
+
+def search_knowledge_bases_with_embedding(kb_ids, query_embedding, top_k=3):
+    """
+    Search several KBs that share an embedding model with one query embedding.
+    
+    Small normalized KBs are searched together in a single vectorized pass
+    over a combined index (top_k per KB in total); anything else falls back
+    to one search per KB.
+    
+    Returns:
+        List of tuples: (chunk_text, distance, kb_id), as search_knowledge_base_with_embedding
+    """
+    kb_ids = list(dict.fromkeys(kb_ids))
+    if not kb_ids:
+        return []
+    try:
+        combined = _open_multi_index(kb_ids) if len(kb_ids) > 1 else None
+    except Exception as e:
+        print(f"[WARN] Combined KB search unavailable: {e}")
+        combined = None
+    if combined is None:
+        results = []
+        for kb_id in kb_ids:
+            results.extend(search_knowledge_base_with_embedding(kb_id, query_embedding, top_k))
+        return results
+
+    index, index_kb_ids, offsets = combined
+    try:
+        query_embedding = np.array(query_embedding, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(query_embedding)
+        scores, indices = index.search(query_embedding, top_k * len(index_kb_ids))
+
+        # Map global rows back to (kb, local row) and read hits per KB
+        positions = indices[0]
+        valid = positions >= 0
+        owners = np.searchsorted(offsets, positions, side="right") - 1
+        results = []
+        for owner, kb_id in enumerate(index_kb_ids):
+            rows = np.flatnonzero(valid & (owners == owner))
+            if rows.size == 0:
+                continue
+            kb_folder = f"app/knowledge_bases/{kb_id}"
+            hits = _read_chunks_at(
+                kb_folder, _find_chunks_path(kb_folder), positions[rows] - offsets[owner]
+            )
+            for row, chunk in zip(rows, hits):
+                if chunk is not None:
+                    results.append((chunk, float(2.0 - 2.0 * scores[0][row]), kb_id))
+        return results
+    except Exception as e:
+        print(f"Error searching knowledge bases {', '.join(index_kb_ids)}: {e}")
+        return []
+
+def _open_small_matrix(kb_folder: str) -> Optional[np.ndarray]:
+    """
+    Normalized embeddings of a small inner-product KB as a cached float32
+    matrix, or None when the KB is too large (or L2) for brute-force search.
+    """
+    embeddings_path = os.path.join(kb_folder, "embeddings.npy")
+    if not os.path.exists(embeddings_path) or os.path.getsize(embeddings_path) > SMALL_KB_MATRIX_BYTES:
+        return None
+    mtime = os.path.getmtime(embeddings_path)
+    with _INDEX_CACHE_LOCK:
+        cached = _SMALL_MATRIX_CACHE.get(embeddings_path)
+        if cached and cached[0] == mtime:
+            _SMALL_MATRIX_CACHE.move_to_end(embeddings_path)
+            return cached[1]
+
+    if _load_index_meta(kb_folder).get("metric") != "ip":
+        return None
+    matrix = np.load(embeddings_path, allow_pickle=False).astype("float32")
+
+    with _INDEX_CACHE_LOCK:
+        _cache_insert(
+            _SMALL_MATRIX_CACHE,
+            embeddings_path,
+            (mtime, matrix, matrix.nbytes),
+            INDEX_CACHE_SIZE,
+            SMALL_MATRIX_CACHE_BYTES,
+        )
+    return matrix
+
+def _search_small_matrix(matrix: np.ndarray, queries: np.ndarray, top_k: int):
+    """Exact top-k by inner product; same (distances, indices) shape as index.search."""
+    scores = queries @ matrix.T
+    k = min(top_k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), (scores.shape[0], k))
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+
 def search_knowledge_base_with_embedding(kb_id, query_embedding, top_k=3):
     """
     Search a specific knowledge base with a pre-computed embedding.
@@ -574,44 +1701,83 @@ def search_knowledge_base_with_embedding(kb_id, query_embedding, top_k=3):
         
     Returns:
         List of tuples: (chunk_text, distance, kb_id)
-        Distance is L2 distance (lower = more similar)
+        Distance is squared L2 on normalized vectors, 2 - 2*cos (lower = more similar)
     """
+    query_embedding = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+    return search_knowledge_base_with_embeddings(kb_id, query_embedding, top_k)[0]
+
+def search_knowledge_base_with_embeddings(kb_id, query_embeddings, top_k=3):
+    """
+    Search a specific knowledge base with several pre-computed embeddings at once.
+    
+    All queries go through a single index.search (or one matmul for small
+    KBs) and the hit chunks are read in one pass.
+    
+    Args:
+        kb_id: Knowledge base ID
+        query_embeddings: (n_queries, dimension) array of query vectors
+        top_k: Number of results to return per query
+        
+    Returns:
+        One list of (chunk_text, distance, kb_id) tuples per query, in query order
+    """
+    # Copy: normalization is in place
+    query_embeddings = np.array(query_embeddings, dtype="float32")
+    if query_embeddings.ndim == 1:
+        query_embeddings = query_embeddings.reshape(1, -1)
+    n_queries = query_embeddings.shape[0]
     try:
         kb_folder = f"app/knowledge_bases/{kb_id}"
         index_path = f"{kb_folder}/index.faiss"
-        chunks_path = f"{kb_folder}/{CHUNKS_JSON_GZ}"
-        if not os.path.exists(chunks_path):
-            migrated_path = _migrate_legacy_chunks_to_json(kb_id)
-            if migrated_path:
-                chunks_path = migrated_path
+        chunks_path = _find_chunks_path(kb_folder) or _migrate_legacy_chunks_to_json(kb_id)
         
-        if not os.path.exists(index_path) or not chunks_path or not os.path.exists(chunks_path):
-            return []
+        if not n_queries or not os.path.exists(index_path) or not chunks_path or not os.path.exists(chunks_path):
+            return [[] for _ in range(n_queries)]
         
-        # Load index and chunks
-        index = faiss.read_index(index_path)
-        chunks = _load_chunks_safe(chunks_path, allow_legacy_pickle=False)
-        
-        # Ensure embedding is the right shape
-        if query_embedding.ndim == 1:
-            query_embedding = query_embedding.reshape(1, -1)
+        # Small KBs: one matmul over the cached matrix beats FAISS dispatch
+        small_matrix = _open_small_matrix(kb_folder)
+        if small_matrix is not None:
+            faiss.normalize_L2(query_embeddings)
+            distances, indices = _search_small_matrix(small_matrix, query_embeddings, top_k)
+            inner_product = True
+        else:
+            index, index_meta = _open_index(kb_folder)
+            inner_product = index_meta.get("metric") == "ip"
+            if inner_product:
+                faiss.normalize_L2(query_embeddings)
+            
+            # Search
+            if index_meta.get("on_gpu"):
+                with _GPU_LOCK:
+                    distances, indices = index.search(query_embeddings, top_k)
+            else:
+                distances, indices = index.search(query_embeddings, top_k)
         
-        # Search
-        distances, indices = index.search(query_embedding, top_k)
+        width = indices.shape[1]
+        hits = _read_chunks_at(kb_folder, chunks_path, indices.ravel())
         
         # Return results with distance and kb_id
         results = []
-        for idx, dist_idx in enumerate(indices[0]):
-            if dist_idx < len(chunks):
-                chunk = chunks[dist_idx]
-                distance = float(distances[0][idx])
-                results.append((chunk, distance, kb_id))
+        for row in range(n_queries):
+            row_results = []
+            for col in range(width):
+                chunk = hits[row * width + col]
+                # IVF/HNSW pad with -1 when fewer than top_k neighbours are found
+                if chunk is None:
+                    continue
+                distance = float(distances[row][col])
+                if inner_product:
+                    # Report squared L2 between unit vectors (2 - 2*cos) so callers
+                    # keep "lower = more similar" and the same threshold scale
+                    distance = 2.0 - 2.0 * distance
+                row_results.append((chunk, distance, kb_id))
+            results.append(row_results)
         
         return results
         
     except Exception as e:
         print(f"Error searching knowledge base {kb_id}: {e}")
-        return []
+        return [[] for _ in range(n_queries)]
 
 def search_knowledge_base(kb_id, query, top_k=3):
     """
@@ -620,8 +1786,20 @@ def search_knowledge_base(kb_id, query, top_k=3):
     
     Returns:
         List of tuples: (chunk_text, distance, kb_id)
-        Distance is L2 distance (lower = more similar)
+        Distance is squared L2 on normalized vectors (lower = more similar)
     """
+    return search_knowledge_base_batch(kb_id, [query], top_k)[0]
+
+def search_knowledge_base_batch(kb_id, queries: List[str], top_k=3):
+    """
+    Search a specific knowledge base with several text queries.
+    All queries are embedded in one request and searched in one index call.
+    
+    Returns:
+        One list of (chunk_text, distance, kb_id) tuples per query, in query order
+    """
+    if not queries:
+        return []
     try:
         # Get KB info to determine provider
         from app.config.knowledge_config import load_knowledge_config
@@ -635,12 +1813,17 @@ def search_knowledge_base(kb_id, query, top_k=3):
         provider = kb_info.get('embedding_provider', 'openai') if kb_info else 'openai'
         model = kb_info.get('embedding_model') if kb_info else None
         
-        # Create query embedding with appropriate provider
-        query_embedding = create_embedding(query, provider=provider, model=model)
+        # Create query embeddings with appropriate provider
+        query_embeddings = _create_embedding_batch(
+            list(queries),
+            provider=provider,
+            model=model,
+            max_attempts=QUERY_EMBEDDING_MAX_ATTEMPTS,
+        )
         
         # Use the embedding-based search
-        return search_knowledge_base_with_embedding(kb_id, query_embedding, top_k)
+        return search_knowledge_base_with_embeddings(kb_id, query_embeddings, top_k)
         
     except Exception as e:
         print(f"Error searching knowledge base {kb_id}: {e}")
-        return []
\ No newline at end of file
+        return [[] for _ in queries]
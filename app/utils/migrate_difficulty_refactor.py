@@ -12,21 +12,59 @@ Backup:
     Creates backup file: exam_profiles.json.backup_<timestamp>
 """
 
-import json
+import functools
 import os
+import re
 import shutil
+import sys
 from datetime import datetime
 from typing import Dict, List, Any
 
+# Add project root to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.utils.json_io import read_json, write_json
+
+PROFILES_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'exam_profiles.json')
+
+# Global difficulty level IDs, lowest to highest
+_LEVEL_IDS = ('1', '2', '3')
+
+# Level 1 indicators (Recall/Knowledge)
+LEVEL_1_INDICATORS = (
+    'definition', 'define', 'identify', 'recognize', 
+    'true about', 'stands for', 'is an example of',
+    'what is', 'which statement is true'
+)
+
+# Level 2 indicators (Application/Analysis)
+LEVEL_2_INDICATORS = (
+    'in this scenario', 'what should you do', 'apply',
+    'determine', 'troubleshoot', 'cause of', 'analyze',
+    'classify', 'which principle applies'
+)
+
+# Level 3 indicators (Evaluation/Judgment)
+LEVEL_3_INDICATORS = (
+    'best', 'most', 'primary', 'first', 'not apply',
+    'would not', 'exception', 'evaluate', 'prioritize',
+    'choose', 'which control', 'most effective'
+)
+
+# One compiled alternation per level, checked in order of specificity (3 → 2 → 1)
+_LEVEL_PATTERNS = tuple(
+    (level_id, re.compile('|'.join(re.escape(indicator) for indicator in indicators)))
+    for level_id, indicators in (
+        ('3', LEVEL_3_INDICATORS),
+        ('2', LEVEL_2_INDICATORS),
+        ('1', LEVEL_1_INDICATORS),
+    )
+)
+
 
 def backup_profiles():
     """Create a timestamped backup of exam_profiles.json"""
-    profiles_path = os.path.join(
-        os.path.dirname(__file__), 
-        '..', 
-        'config', 
-        'exam_profiles.json'
-    )
+    profiles_path = PROFILES_PATH
     
     if not os.path.exists(profiles_path):
         print("[WARN] exam_profiles.json not found - nothing to backup")
@@ -41,6 +79,7 @@ def backup_profiles():
     return backup_path
 
 
+@functools.lru_cache(maxsize=4096)
 def analyze_question_type_phrase(phrase: str) -> str:
     """
     Heuristically determine difficulty level from question type phrase.
@@ -57,39 +96,10 @@ def analyze_question_type_phrase(phrase: str) -> str:
     """
     phrase_lower = phrase.lower()
     
-    # Level 1 indicators (Recall/Knowledge)
-    level_1_indicators = [
-        'definition', 'define', 'identify', 'recognize', 
-        'true about', 'stands for', 'is an example of',
-        'what is', 'which statement is true'
-    ]
-    
-    # Level 2 indicators (Application/Analysis)
-    level_2_indicators = [
-        'in this scenario', 'what should you do', 'apply',
-        'determine', 'troubleshoot', 'cause of', 'analyze',
-        'classify', 'which principle applies'
-    ]
-    
-    # Level 3 indicators (Evaluation/Judgment)
-    level_3_indicators = [
-        'best', 'most', 'primary', 'first', 'not apply',
-        'would not', 'exception', 'evaluate', 'prioritize',
-        'choose', 'which control', 'most effective'
-    ]
-    
     # Check in order of specificity (3 → 2 → 1)
-    for indicator in level_3_indicators:
-        if indicator in phrase_lower:
-            return "3"
-    
-    for indicator in level_2_indicators:
-        if indicator in phrase_lower:
-            return "2"
-    
-    for indicator in level_1_indicators:
-        if indicator in phrase_lower:
-            return "1"
+    for level_id, pattern in _LEVEL_PATTERNS:
+        if pattern.search(phrase_lower):
+            return level_id
     
     # Default: assume Level 3 (most conservative - evaluation/judgment)
     return "3"
@@ -116,13 +126,17 @@ def migrate_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
     # 1. Tag question types with difficulty levels
     question_types = profile.get('question_types', [])
     
+    # Collect per-question-type log lines and print them in one write
+    tagged_lines: List[str] = []
     for qt in question_types:
         if 'difficulty_level' not in qt:
             # Use heuristic to determine level from phrase
             phrase = qt.get('phrase', '')
             inferred_level = analyze_question_type_phrase(phrase)
             qt['difficulty_level'] = inferred_level
-            print(f"  - Tagged question type '{qt.get('id')}' as Level {inferred_level} (inferred from phrase)")
+            tagged_lines.append(f"  - Tagged question type '{qt.get('id')}' as Level {inferred_level} (inferred from phrase)")
+    if tagged_lines:
+        print("\n".join(tagged_lines))
     
     # 2. Create default difficulty_profile
     if 'difficulty_profile' not in profile:
@@ -138,24 +152,25 @@ def migrate_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
         
         if not enabled_levels:
             # Fallback: if no question types exist, enable all levels
-            enabled_levels = ['1', '2', '3']
+            enabled_levels = list(_LEVEL_IDS)
             print(f"  - No question types found, enabling all levels by default")
         else:
             print(f"  - Enabling only levels with question types: {enabled_levels}")
         
         # Calculate equal weights for enabled levels
-        num_enabled = len(enabled_levels)
-        base_weight = 1.0 / num_enabled
-        weights = {}
-        for i, level_id in enumerate(['1', '2', '3']):
-            if level_id in enabled_levels:
-                # Add remainder to last enabled level for exact 1.0 sum
-                if i == len(['1', '2', '3']) - 1:
-                    weights[level_id] = 1.0 - sum(weights.values())
-                else:
-                    weights[level_id] = round(base_weight, 2)
-            else:
-                weights[level_id] = 0.0
+        enabled_set = set(enabled_levels)
+        base_weight = round(1.0 / len(enabled_levels), 2)
+        weights = {
+            level_id: (base_weight if level_id in enabled_set else 0.0)
+            for level_id in _LEVEL_IDS
+        }
+        # Add remainder to last enabled level for exact 1.0 sum
+        known_enabled = [level_id for level_id in _LEVEL_IDS if level_id in enabled_set]
+        if known_enabled:
+            last_level = known_enabled[-1]
+            weights[last_level] = round(
+                1.0 - sum(weight for level_id, weight in weights.items() if level_id != last_level), 6
+            )
         
         # Preserve custom display names from old difficulty_levels if they exist
         display_names = {
@@ -168,7 +183,7 @@ def migrate_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
             old_levels = profile['difficulty_levels']
             for old_level in old_levels:
                 level_id = old_level.get('level_id')
-                if level_id in ['1', '2', '3']:
+                if level_id in _LEVEL_IDS:
                     display_names[level_id] = old_level.get('name', f'Level {level_id}')
                     print(f"  - Preserved display name for Level {level_id}: '{display_names[level_id]}'")
         
@@ -197,12 +212,7 @@ def migrate_all_profiles():
     Returns:
         Tuple of (success, message)
     """
-    profiles_path = os.path.join(
-        os.path.dirname(__file__), 
-        '..', 
-        'config', 
-        'exam_profiles.json'
-    )
+    profiles_path = PROFILES_PATH
     
     if not os.path.exists(profiles_path):
         return False, "exam_profiles.json not found"
@@ -212,8 +222,7 @@ def migrate_all_profiles():
     
     # Load profiles
     try:
-        with open(profiles_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
+        config = read_json(profiles_path)
     except Exception as e:
         return False, f"Failed to load profiles: {str(e)}"
     
@@ -238,8 +247,7 @@ def migrate_all_profiles():
     
     # Save migrated profiles
     try:
-        with open(profiles_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        write_json(profiles_path, config)
         
         print(f"\n[SUCCESS] Successfully migrated {migrated_count}/{len(profiles)} profiles")
         print(f"[INFO] Migrated profiles saved to: {profiles_path}")
@@ -266,12 +274,7 @@ def rollback_migration(backup_path: str):
     if not os.path.exists(backup_path):
         return False, f"Backup file not found: {backup_path}"
     
-    profiles_path = os.path.join(
-        os.path.dirname(__file__), 
-        '..', 
-        'config', 
-        'exam_profiles.json'
-    )
+    profiles_path = PROFILES_PATH
     
     try:
         shutil.copy2(backup_path, profiles_path)
@@ -6,7 +6,6 @@ KBs with profile_type or profile_domain are linked to cissp_2024.
 KBs without these fields remain general (exam_profile_id = null).
 """
 
-import json
 import os
 import sys
 
@@ -14,6 +13,7 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
 from app.config.knowledge_config import KNOWLEDGE_CONFIG_PATH
+from app.utils.json_io import read_json, write_json
 
 
 def migrate_kb_exam_profile_linking():
@@ -26,12 +26,13 @@ def migrate_kb_exam_profile_linking():
         return False
     
     # Load current config
-    with open(KNOWLEDGE_CONFIG_PATH, "r", encoding="utf-8") as f:
-        config = json.load(f)
+    config = read_json(KNOWLEDGE_CONFIG_PATH)
     
     kbs = config.get("knowledge_bases", [])
     migrated_count = 0
     already_migrated = 0
+    # Collect per-KB log lines and print them in one write
+    log_lines = []
     
     for kb in kbs:
         # Check if already has exam_profile_id field
@@ -46,17 +47,19 @@ def migrate_kb_exam_profile_linking():
         if has_profile_type or has_profile_domain:
             # Link to CISSP profile
             kb["exam_profile_id"] = "cissp_2024"
-            print(f"[MIGRATED] {kb.get('title', 'Unknown')} -> cissp_2024")
+            log_lines.append(f"[MIGRATED] {kb.get('title', 'Unknown')} -> cissp_2024")
         else:
             # General KB (no profile)
             kb["exam_profile_id"] = None
-            print(f"[GENERAL] {kb.get('title', 'Unknown')} -> no profile")
+            log_lines.append(f"[GENERAL] {kb.get('title', 'Unknown')} -> no profile")
         
         migrated_count += 1
     
+    if log_lines:
+        print("\n".join(log_lines))
+    
     # Save updated config
-    with open(KNOWLEDGE_CONFIG_PATH, "w", encoding="utf-8") as f:
-        json.dump(config, f, indent=2, ensure_ascii=False)
+    write_json(KNOWLEDGE_CONFIG_PATH, config)
     
     print(f"\n[SUMMARY]")
     print(f"  Migrated: {migrated_count} KBs")
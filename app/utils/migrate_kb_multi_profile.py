@@ -7,28 +7,35 @@ to multi-profile exam_profile_ids array format.
 Run once after updating to multi-profile support.
 """
 
-import json
 import os
+import shutil
+import sys
 from datetime import datetime
 
+# Add project root to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.utils.json_io import read_json, write_json
+
+KNOWLEDGE_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "knowledge_bases.json")
+
 
 def migrate_kb_to_multi_profile():
     """Migrate knowledge_bases.json to use exam_profile_ids arrays"""
     
-    kb_config_path = os.path.join(
-        os.path.dirname(__file__), "..", "config", "knowledge_bases.json"
-    )
+    kb_config_path = KNOWLEDGE_PATH
     
     if not os.path.exists(kb_config_path):
         print("No knowledge_bases.json found - nothing to migrate")
         return
     
     # Load current config
-    with open(kb_config_path, "r", encoding="utf-8") as f:
-        config = json.load(f)
+    config = read_json(kb_config_path)
     
     kbs = config.get("knowledge_bases", [])
     migrated_count = 0
+    # Collect per-KB log lines and print them in one write
+    log_lines = []
     
     for kb in kbs:
         # Check if already migrated (has exam_profile_ids)
@@ -40,29 +47,28 @@ def migrate_kb_to_multi_profile():
         
         if old_profile_id:
             kb["exam_profile_ids"] = [old_profile_id]
-            print(f"Migrated KB '{kb.get('title')}': '{old_profile_id}' -> [{old_profile_id}]")
+            log_lines.append(f"Migrated KB '{kb.get('title')}': '{old_profile_id}' -> [{old_profile_id}]")
         else:
             kb["exam_profile_ids"] = []
-            print(f"Migrated KB '{kb.get('title')}': None -> []")
+            log_lines.append(f"Migrated KB '{kb.get('title')}': None -> []")
         
         # Remove old field
         kb.pop("exam_profile_id", None)
         migrated_count += 1
     
+    if log_lines:
+        print("\n".join(log_lines))
+    
     # Save updated config
     if migrated_count > 0:
-        # Backup original
+        # Backup original (the file on disk is still unmigrated)
         backup_path = kb_config_path + f".backup_{int(datetime.now().timestamp())}"
-        with open(backup_path, "w", encoding="utf-8") as f:
-            # Write the original config to backup before migrating
-            f.seek(0)
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        shutil.copy2(kb_config_path, backup_path)
         
         print(f"\nBackup created: {backup_path}")
         
         # Write migrated config
-        with open(kb_config_path, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        write_json(kb_config_path, config)
         
         print(f"\n[OK] Migration complete: {migrated_count} KB(s) migrated")
         print(f"     Knowledge bases now support multiple exam profiles")
@@ -12,8 +12,10 @@ import os
 import sys
 from datetime import datetime
 
-# Add parent directory to path for imports
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add project root to path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.utils.json_io import read_json, write_json
 
 AGENTS_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "agents.json")
 KNOWLEDGE_PATH = os.path.join(os.path.dirname(__file__), "..", "config", "knowledge_bases.json")
@@ -27,14 +29,15 @@ def migrate_agents():
         return
     
     try:
-        with open(AGENTS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json(AGENTS_PATH)
     except (json.JSONDecodeError, FileNotFoundError):
         print("[ERROR] Could not load agents.json")
         return
     
     agents = data.get("agents", {})
     migrated_count = 0
+    # Collect per-agent log lines and print them in one write
+    log_lines = []
     
     for agent_id, agent_data in agents.items():
         # Check if agent has enable_cissp_mode set to True
@@ -43,16 +46,18 @@ def migrate_agents():
             if "exam_profile_id" not in agent_data or agent_data["exam_profile_id"] is None:
                 agent_data["exam_profile_id"] = "cissp_2024"
                 migrated_count += 1
-                print(f"[MIGRATE] Agent '{agent_data.get('name', agent_id)}': enable_cissp_mode=True -> exam_profile_id='cissp_2024'")
+                log_lines.append(f"[MIGRATE] Agent '{agent_data.get('name', agent_id)}': enable_cissp_mode=True -> exam_profile_id='cissp_2024'")
         else:
             # Ensure exam_profile_id is None for agents without CISSP mode
             if "exam_profile_id" not in agent_data:
                 agent_data["exam_profile_id"] = None
     
+    if log_lines:
+        print("\n".join(log_lines))
+    
     # Save migrated agents
     if migrated_count > 0:
-        with open(AGENTS_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_json(AGENTS_PATH, data)
         print(f"[SUCCESS] Migrated {migrated_count} agent(s) to exam profiles")
     else:
         print("[INFO] No agents needed migration (already using exam_profile_id)")
@@ -66,14 +71,15 @@ def migrate_knowledge_bases():
         return
     
     try:
-        with open(KNOWLEDGE_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json(KNOWLEDGE_PATH)
     except (json.JSONDecodeError, FileNotFoundError):
         print("[ERROR] Could not load knowledge.json")
         return
     
     kbs = data.get("knowledge_bases", [])
     migrated_count = 0
+    # Collect per-KB log lines and print them in one write
+    log_lines = []
     
     for kb in kbs:
         changed = False
@@ -97,17 +103,19 @@ def migrate_knowledge_bases():
             title = kb.get("title", "").lower()
             kb["is_priority_kb"] = "golden" in title
             if kb["is_priority_kb"]:
-                print(f"[MIGRATE] KB '{kb.get('title', kb.get('id'))}': detected as priority KB")
+                log_lines.append(f"[MIGRATE] KB '{kb.get('title', kb.get('id'))}': detected as priority KB")
             changed = True
         
         if changed:
             migrated_count += 1
-            print(f"[MIGRATE] KB '{kb.get('title', kb.get('id'))}': updated profile fields")
+            log_lines.append(f"[MIGRATE] KB '{kb.get('title', kb.get('id'))}': updated profile fields")
+    
+    if log_lines:
+        print("\n".join(log_lines))
     
     # Save migrated KBs
     if migrated_count > 0:
-        with open(KNOWLEDGE_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_json(KNOWLEDGE_PATH, data)
         print(f"[SUCCESS] Migrated {migrated_count} knowledge base(s) to exam profiles")
     else:
         print("[INFO] No knowledge bases needed migration (already using profile fields)")
@@ -121,8 +129,7 @@ def verify_migration():
     # Check agents
     if os.path.exists(AGENTS_PATH):
         try:
-            with open(AGENTS_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = read_json(AGENTS_PATH)
             agents = data.get("agents", {})
             
             cissp_agents = sum(1 for a in agents.values() if a.get("exam_profile_id") == "cissp_2024")
@@ -133,8 +140,7 @@ def verify_migration():
     # Check KBs
     if os.path.exists(KNOWLEDGE_PATH):
         try:
-            with open(KNOWLEDGE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = read_json(KNOWLEDGE_PATH)
             kbs = data.get("knowledge_bases", [])
             
             profile_kbs = sum(1 for kb in kbs if "profile_type" in kb or "profile_domain" in kb)
@@ -0,0 +1,26 @@
+"""
+Page extraction for the PDF process pool.
+
+Spawned workers import only this module, not knowledge_processor, so they
+never create GPU resources, thread pools or API clients of their own.
+"""
+
+import pypdf
+
+_reader = None
+_file = None
+
+
+def init_worker(file_path):
+    """Open the PDF once per worker process."""
+    global _reader, _file
+    _file = open(file_path, "rb")
+    _reader = pypdf.PdfReader(_file)
+
+
+def extract_page(page_index):
+    """Extract one page in a worker; returns (text, error message)."""
+    try:
+        return _reader.pages[page_index].extract_text() or "", None
+    except Exception as page_error:
+        return "", str(page_error)
@@ -0,0 +1,135 @@
+"""
+On-disk cache of fetched URL bodies for conditional GETs.
+
+The ETag / Last-Modified validators of each cached URL are sent back on the
+next fetch; a 304 Not Modified answer is served from the stored body instead
+of downloading the page again. Stored bodies are capped at URL_CACHE_MAX_BYTES
+in total; the least recently used ones are dropped past that.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+URL_CACHE_DIR = os.path.join(
+    os.path.dirname(__file__), "..", "knowledge_bases", "_url_cache"
+)
+URL_CACHE_INDEX = "index.json"
+URL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class UrlCache:
+    """
+    Validators and bodies keyed by URL:
+    {url: {etag, last_modified, content_type, body_sha, body_file, size, last_used}}.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = URL_CACHE_MAX_BYTES):
+        self.path = path or URL_CACHE_DIR
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, dict]] = None
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                with open(os.path.join(self.path, URL_CACHE_INDEX), "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        index_path = os.path.join(self.path, URL_CACHE_INDEX)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, index_path)
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for a cached URL (empty when not cached)."""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get(self, url: str) -> Optional[tuple]:
+        """Return (content_type, body) for a cached URL, or None."""
+        with self._lock:
+            entry = self._load_index().get(url)
+        if not entry:
+            return None
+        try:
+            with open(os.path.join(self.path, entry["body_file"]), "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(body).hexdigest() != entry.get("body_sha"):
+            return None
+        with self._lock:
+            # Only read on a 304, so refreshing the LRU stamp here is cheap
+            entry["last_used"] = time.time()
+            try:
+                self._save_index()
+            except OSError:
+                pass
+        return entry.get("content_type", ""), body
+
+    def put(self, url: str, headers, content_type: str, body: bytes):
+        """Store a body when the response carries a validator to revalidate it with."""
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if (not etag and not last_modified) or len(body) > self.max_bytes:
+            return
+        body_file = hashlib.sha256(url.encode("utf-8")).hexdigest() + ".body"
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            body_path = os.path.join(self.path, body_file)
+            with open(body_path + ".tmp", "wb") as f:
+                f.write(body)
+            os.replace(body_path + ".tmp", body_path)
+            self._load_index()[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_type": content_type,
+                "body_sha": hashlib.sha256(body).hexdigest(),
+                "body_file": body_file,
+                "size": len(body),
+                "last_used": time.time(),
+            }
+            self._prune()
+            self._save_index()
+
+    def _prune(self):
+        """Drop least recently used bodies until the total fits in max_bytes."""
+        index = self._load_index()
+        for entry in index.values():
+            if "size" not in entry:
+                # Entries written before the cap existed
+                try:
+                    entry["size"] = os.path.getsize(os.path.join(self.path, entry["body_file"]))
+                except OSError:
+                    entry["size"] = 0
+        total = sum(entry["size"] for entry in index.values())
+        for url, entry in sorted(index.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, entry["body_file"]))
+            except OSError:
+                pass
+            total -= entry["size"]
+            del index[url]
+
+
+# Global instance
+url_cache = UrlCache()
@@ -11,7 +11,6 @@ import logging
 import uuid
 import threading
 from werkzeug.utils import secure_filename
-from datetime import datetime
 from app.agents.agent import generate_reply
 
 from app.config.knowledge_config import (
@@ -19,10 +18,15 @@ from app.config.knowledge_config import (
     get_active_knowledge_bases, update_embedding_status,
     save_knowledge_config, cleanup_orphaned_kb_references
 )
-from app.utils.knowledge_processor import process_knowledge_base, validate_url_for_ssrf
+from app.utils.knowledge_processor import (
+    process_knowledge_base,
+    validate_url_for_ssrf,
+    count_kb_chunks,
+)
 from app.api.agent_api import AgentAPI
 from app.models.chat_session import chat_session_manager
 from app.models.user import db, User, Role
+from app.models.login_lockout import login_lockout_manager
 from app.models.audit_log import AuditLog
 from app.models.question_record import QuestionRecord
 from app.config.api_config import run_startup_api_key_migration
@@ -180,7 +184,9 @@ from flask_security.signals import user_authenticated
 @user_authenticated.connect_via(app)
 def on_user_authenticated(sender, user, **extra):
     """Reset failed login count on successful authentication"""
-    user.reset_failed_login()
+    login_lockout_manager.reset(user.id)
+    if user.failed_login_count or user.locked_until is not None:
+        user.reset_failed_login()
     db.session.commit()
 
 @app.before_request
@@ -191,17 +197,16 @@ def check_account_lockout():
         if email:
             user = user_datastore.find_user(email=email)
             if user:
-                # Check if account is locked
-                if user.is_locked():
-                    minutes_left = int((user.locked_until - datetime.utcnow()).total_seconds() / 60)
-                    if minutes_left > 0:
-                        flash(f"Account locked. Try again in {minutes_left} minutes.", "error")
-                        return redirect(url_for('security.login'))
-                    else:
-                        # Lock expired, reset it
-                        user.locked_until = None
-                        user.failed_login_count = 0
-                        db.session.commit()
+                # Check if account is locked (Redis store, then the persisted lock
+                # on the user row, which every worker sees)
+                seconds_left = (
+                    login_lockout_manager.seconds_remaining(user.id)
+                    or user.lock_seconds_remaining()
+                )
+                if seconds_left > 0:
+                    minutes_left = max(seconds_left // 60, 1)
+                    flash(f"Account locked. Try again in {minutes_left} minutes.", "error")
+                    return redirect(url_for('security.login'))
 
 @app.after_request
 def track_failed_login(response):
@@ -211,11 +216,12 @@ def track_failed_login(response):
         # If not authenticated after POST to login, it failed
         if email and not current_user.is_authenticated:
             user = user_datastore.find_user(email=email)
-            if user and not user.is_locked():
-                user.increment_failed_login()
+            if user and not user.is_locked() and not login_lockout_manager.is_locked(user.id):
+                # Counter lives in Redis when configured (only a lockout touches
+                # the DB), otherwise on the user row
+                locked = login_lockout_manager.record_failure(user)
                 db.session.commit()
-                
-                if user.is_locked():
+                if locked:
                     flash("Too many failed attempts. Account locked for 15 minutes.", "error")
     
     return response
@@ -950,24 +956,9 @@ def knowledge_bases():
             if kb_id in agent.knowledge_bases:
                 assigned_agents.append(agent.name)
         
-        # Count chunks if available
-        chunks_count = None
+        # Count chunks if available (header read; legacy KBs load their chunks)
         base_dir = os.path.join(os.path.dirname(__file__), "..", "knowledge_bases", kb_id)
-        chunks_path = os.path.join(base_dir, "chunks.json.gz")
-        if not os.path.exists(chunks_path):
-            chunks_path = os.path.join(base_dir, "chunks.pkl.gz")
-        if not os.path.exists(chunks_path):
-            chunks_path = os.path.join(base_dir, "chunks.pkl")
-        if os.path.exists(chunks_path):
-            try:
-                from app.utils.knowledge_processor import _load_chunks_safe
-                chunks = _load_chunks_safe(
-                    chunks_path,
-                    allow_legacy_pickle=chunks_path.endswith(".pkl") or chunks_path.endswith(".pkl.gz"),
-                )
-                chunks_count = len(chunks)
-            except Exception:
-                pass
+        chunks_count = count_kb_chunks(base_dir)
         
         # Get profile names from IDs
         exam_profile_ids = kb_info.get('exam_profile_ids', [])
@@ -0,0 +1,31 @@
+import pytest
+
+from app.utils import knowledge_processor as kp
+
+
+HTML = b"""<html><head><style>p { color: red; }</style></head>
+<body><script>var hidden = 1;</script><h1>Title</h1>
+<p>First  paragraph</p><p>Second paragraph</p></body></html>"""
+
+
+def test_html_to_text_uses_selectolax(monkeypatch):
+    pytest.importorskip("selectolax.lexbor")
+    assert kp.HTMLParser is not None, "selectolax lexbor backend failed to import"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("BeautifulSoup fallback used instead of selectolax")
+
+    monkeypatch.setattr(kp, "BeautifulSoup", fail)
+    text = kp._html_to_text(HTML)
+
+    assert text.splitlines() == ["Title", "First", "paragraph", "Second paragraph"]
+
+
+def test_html_to_text_falls_back_to_beautifulsoup(monkeypatch):
+    monkeypatch.setattr(kp, "HTMLParser", None)
+    text = kp._html_to_text(HTML)
+
+    assert "hidden" not in text
+    assert "color" not in text
+    # get_text() joins adjacent inline text, so the paragraphs run together
+    assert text.splitlines() == ["Title", "First", "paragraphSecond paragraph"]
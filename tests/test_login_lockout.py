@@ -0,0 +1,56 @@
+import time
+
+import pytest
+
+pytest.importorskip("redis")
+
+from app.models.login_lockout import LoginLockoutManager
+
+
+class FakeUser:
+    """Stand-in for the User row: just the lockout fields and methods."""
+
+    id = 1
+
+    def __init__(self):
+        self.failed_login_count = 0
+        self.locked = False
+
+    def increment_failed_login(self):
+        self.failed_login_count += 1
+        self.locked = self.failed_login_count >= 5
+
+    def is_locked(self):
+        return self.locked
+
+    def record_lockout(self, attempts, lockout_seconds):
+        raise AssertionError("Redis lockout recorded without Redis")
+
+
+def test_unreachable_redis_falls_back_to_user_row():
+    # Nothing listens on port 1, so every Redis call fails to connect
+    manager = LoginLockoutManager(redis_url="redis://127.0.0.1:1/0")
+    user = FakeUser()
+
+    started = time.monotonic()
+    assert manager.seconds_remaining(user.id) is None
+    results = [manager.record_failure(user) for _ in range(5)]
+    elapsed = time.monotonic() - started
+
+    assert user.failed_login_count == 5
+    assert results == [False, False, False, False, True]
+    assert elapsed < 2
+
+
+def test_blackholed_redis_is_bounded_by_socket_timeout():
+    # Non-routable address: connects hang until socket_connect_timeout
+    manager = LoginLockoutManager(redis_url="redis://10.255.255.1:6379/0")
+    user = FakeUser()
+
+    started = time.monotonic()
+    assert manager.record_failure(user) is False
+    assert manager.record_failure(user) is False
+    elapsed = time.monotonic() - started
+
+    assert user.failed_login_count == 2
+    assert elapsed < 2